@@ -1,23 +1,849 @@
+import startup_timing  # Als Erstes importieren: misst den Start ab hier
 import sys
+import html
+import itertools
+import logging
+import threading
+import time
 from PySide6.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QTextEdit, QComboBox, QMessageBox, QFileDialog
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QPushButton, QLabel, QTextEdit, QComboBox, QMessageBox,
+    QFileDialog, QCheckBox, QDialog, QListWidget, QListWidgetItem, QScrollArea, QListView, QStyledItemDelegate, QStyle,
+    QLineEdit, QProgressBar, QSpinBox, QProgressDialog, QInputDialog, QAbstractItemView
 )
-from PySide6.QtGui import QTextDocument, QKeySequence
-from PySide6.QtCore import QTimer, Qt, QEvent
-from PySide6.QtPrintSupport import QPrinter, QPrintDialog
-from deep_translator import GoogleTranslator  # Neue Übersetzungsbibliothek
-from utils import get_installed_models, generate_ollama_prompt  # Eigene Hilfsfunktionen
+from PySide6.QtGui import (
+    QTextDocument, QKeySequence, QTextCursor, QColor, QPainter, QPdfWriter, QPageLayout, QPageSize
+)
+from PySide6.QtCore import (
+    QTimer, Qt, QEvent, QThread, QObject, Signal, QAbstractListModel, QModelIndex, QSize, QRect, QRectF, QSizeF,
+    QMarginsF
+)
+from pipeline import PipelineError
+from config import (
+    PIPELINED_TRANSLATION, INPUT_DEBOUNCE_MS, RESPONSE_CACHE, METRICS_PORT, SCHEDULER_MAX_PER_MODEL, MODEL_PRELOAD,
+    MODEL_UNLOAD_PREVIOUS, MODEL_STATE_POLL_MS
+)
+from batch import run_batch, format_progress
+from chat_core import ChatSession, LANGUAGE_MAP
+from ollama_client import is_server_available, close_client
+from model_lifecycle import get_lifecycle, LOADING, WARM
+from model_options import OPTION_KEYS, get_model_options, tune, format_result
+from model_registry import get_registry
+from fanout import compare_models
+from conversation_store import get_store, close_store
+from export import (
+    ROLE_LABELS, FORMATS, WRITERS, ExportCancelled, message_html, session_heading, export_filename, bulk_targets,
+    export_sessions, render_session
+)
+from response_cache import EXACT, SEMANTIC
+from scheduler import GenerationScheduler, get_scheduler, PRIORITY_INTERACTIVE, QUEUED, RUNNING
+from telemetry import configure_logging, build_span, start_metrics_server
+
+startup_timing.mark('Importe')
+
+STREAM_FLUSH_INTERVAL = 0.05  # Sekunden zwischen zwei Aktualisierungen des Antwortfeldes
+
+CACHE_NOTES = {EXACT: 'aus dem Cache', SEMANTIC: 'ähnliche Anfrage aus dem Cache'}
+PDF_BLOCK_MESSAGES = 200  # Nachrichten pro Textdokument beim Setzen der Seiten
+
+class TranscriptModel(QAbstractListModel):
+    """Gesprächsverlauf als Liste von Nachrichten; Tokens werden nur an die letzte Zeile angehängt."""
+    MessageRole = Qt.ItemDataRole.UserRole
+    RevisionRole = Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.messages = []  # {'key', 'role', 'text', 'note', 'revision'}
+        self._keys = itertools.count()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.messages)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self.messages[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            if message['note']:
+                return f"{ROLE_LABELS[message['role']]} ({message['note']}): {message['text']}"
+            return f"{ROLE_LABELS[message['role']]}: {message['text']}"
+        if role == self.MessageRole:
+            return message
+        if role == self.RevisionRole:
+            return (message['key'], message['revision'])
+        return None
+
+    def _new_message(self, role, text):
+        return {'key': next(self._keys), 'role': role, 'text': text, 'note': '', 'revision': 0}
+
+    def append_message(self, role, text=''):
+        row = len(self.messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.messages.append(self._new_message(role, text))
+        self.endInsertRows()
+
+    def prepend_messages(self, messages):
+        """Fügt ältere Nachrichten [(Rolle, Text), ...] oben ein."""
+        if not messages:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self.messages[:0] = [self._new_message(role, text) for role, text in messages]
+        self.endInsertRows()
+
+    def append_to_last(self, text):
+        self._update_last(self.messages[-1]['text'] + text)
+
+    def set_last_text(self, text, note=''):
+        self._update_last(text, note)
+
+    def _update_last(self, text, note=None):
+        message = self.messages[-1]
+        message['text'] = text
+        if note is not None:
+            message['note'] = note
+        message['revision'] += 1
+        index = self.index(len(self.messages) - 1)
+        self.dataChanged.emit(index, index)
+
+    def remove_last(self, count):
+        count = min(count, len(self.messages))
+        if count:
+            self.beginRemoveRows(QModelIndex(), len(self.messages) - count, len(self.messages) - 1)
+            del self.messages[-count:]
+            self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.messages = []
+        self.endResetModel()
+
+    def last_interaction_text(self):
+        """Letzte Frage und Antwort im Format 'Benutzer: ...\nAI: ...'."""
+        return "\n".join(f"{ROLE_LABELS[m['role']]}: {m['text']}" for m in self.messages[-2:])
+
+class TranscriptDelegate(QStyledItemDelegate):
+    """Zeichnet eine Nachricht mit Zeilenumbruch; Größen werden pro Zeile und Breite zwischengespeichert."""
+    PADDING = 8
+    COLORS = {'user': QColor(140, 200, 140), 'assistant': QColor(215, 215, 215)}
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self._size_cache = {}  # Nachricht -> (Breite, Revision, QSize)
+        view.model().modelReset.connect(self._size_cache.clear)
+        view.model().rowsRemoved.connect(self._size_cache.clear)
+        view.model().dataChanged.connect(lambda top_left, *args: self.sizeHintChanged.emit(top_left))
+
+    def _text_rect(self, width):
+        return QRect(0, 0, max(1, width - 2 * self.PADDING), 1000000)
+
+    def sizeHint(self, option, index):
+        width = self.view.viewport().width()
+        key, revision = index.data(TranscriptModel.RevisionRole)
+        cached = self._size_cache.get(key)
+        if cached is not None and cached[0] == width and cached[1] == revision:
+            return cached[2]
+        bounding = option.fontMetrics.boundingRect(self._text_rect(width), Qt.TextFlag.TextWordWrap, index.data())
+        size = QSize(width, bounding.height() + 2 * self.PADDING)
+        self._size_cache[key] = (width, revision, size)
+        return size
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, QColor(31, 84, 30))
+        message = index.data(TranscriptModel.MessageRole)
+        painter.setPen(self.COLORS[message['role']])
+        text_rect = option.rect.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING)
+        painter.drawText(text_rect, Qt.TextFlag.TextWordWrap, index.data())
+        painter.restore()
+
+class GenerationWorker(QObject):
+    """Eine Gesprächsrunde als Auftrag für den Scheduler; die Signale gehen an die Oberfläche."""
+    anweisung_translated = Signal(str)
+    chunk_received = Signal(str)
+    generation_finished = Signal(str, str)
+    generation_cancelled = Signal()
+    generation_failed = Signal(str, str)
+    status_changed = Signal(str)
+    stats_updated = Signal(dict)  # Laufend geschätzte Tokens/s, am Ende der Span der Runde
+
+    def __init__(self, session, anweisung, selected_language, selected_model, parent=None):
+        super().__init__(parent)
+        self.session = session
+        self.anweisung = anweisung
+        self.selected_language = selected_language
+        self.selected_model = selected_model
+        self.pipelined = session.pipelined
+        self.stats = {}  # stats['cache'] ist gesetzt, wenn die Antwort aus dem Cache kam
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._tokens = 0
+        self._first_token_at = None
+
+    def _on_token(self, chunk):
+        # Tokens zählen und (ohne Pipeline) sammeln; in kleinen Paketen an die Oberfläche weitergeben
+        now = time.monotonic()
+        if self._first_token_at is None:
+            self._first_token_at = now
+        self._tokens += 1
+        if not self.pipelined:
+            self._pending.append(chunk)
+        if now - self._last_flush >= STREAM_FLUSH_INTERVAL:
+            self._flush_chunks()
+            if now > self._first_token_at:
+                self.stats_updated.emit({'tokens': self._tokens, 'tokens_per_sec': self._tokens / (now - self._first_token_at)})
+
+    def _flush_chunks(self):
+        if self._pending:
+            self.chunk_received.emit(''.join(self._pending))
+            self._pending.clear()
+        self._last_flush = time.monotonic()
+
+    def run(self, cancel_event):
+        """Läuft in einem Thread des Schedulers."""
+        try:
+            # Hängt die Runde noch hier im Hintergrund an den Kontext an, damit ein wartender Auftrag sie sieht
+            result = self.session.run_turn(
+                self.anweisung, self.selected_model, self.selected_language,
+                on_anweisung=self.anweisung_translated.emit,
+                on_chunk=self._on_token,
+                on_segment=self.chunk_received.emit,  # Übersetzte Sätze (Pipeline-Modus)
+                cancel_event=cancel_event,
+                stats=self.stats
+            )
+        except PipelineError as e:
+            self._flush_chunks()
+            self.generation_failed.emit(e.title, e.message)
+            return
+        except Exception as e:
+            # Sonst verschluckt der Scheduler den Fehler und die Oberfläche bleibt im Streaming-Zustand
+            logging.exception(f"Unerwarteter Fehler bei der Generierung: {e}")
+            self._flush_chunks()
+            self.generation_failed.emit('Fehler', str(e))
+            return
+        self._flush_chunks()
+        if result is None:
+            self.generation_cancelled.emit()
+            return
+        anweisung, generated_text = result
+        self.stats_updated.emit(build_span(self.selected_model, self.stats))
+        self.generation_finished.emit(anweisung, generated_text)
+
+class ModelRefreshWorker(QThread):
+    """Fragt die installierten Modelle im Hintergrund beim Server ab."""
+    models_loaded = Signal(list, bool)
+
+    def run(self):
+        try:
+            models = get_registry().refresh()
+        except Exception as e:
+            logging.error(f"Fehler beim Abrufen der Modelle: {e}")
+            models = []
+        self.models_loaded.emit(models, bool(models) or is_server_available())
+
+class ModelStateBridge(QObject):
+    """Leitet Zustandsänderungen der Modellverwaltung aus Hintergrund-Threads in den GUI-Thread."""
+    state_changed = Signal(str, str)
+
+class ResidentModelsWorker(QThread):
+    """Fragt im Hintergrund ab, welche Modelle der Server geladen hat (/api/ps)."""
+
+    def run(self):
+        get_lifecycle().refresh_resident()
+
+class CompareWorker(QThread):
+    """Sendet dieselbe Anweisung parallel an mehrere Modelle."""
+    model_started = Signal(str)
+    chunk_received = Signal(str, str)
+    model_finished = Signal(str, str, dict)
+    model_failed = Signal(str, str)
+
+    def __init__(self, anweisung, selected_language, target_language, models, parent=None):
+        super().__init__(parent)
+        self.anweisung = anweisung
+        self.selected_language = selected_language
+        self.target_language = target_language
+        self.models = models
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        compare_models(
+            self.anweisung, self.selected_language, self.target_language, self.models,
+            on_started=self.model_started.emit,
+            on_chunk=self.chunk_received.emit,
+            on_finished=self.model_finished.emit,
+            on_failed=self.model_failed.emit,
+            cancel_event=self.cancel_event
+        )
+
+class CompareDialog(QDialog):
+    """Modellvergleich: jede Antwort erscheint in einem eigenen Feld mit Latenz und Tokens/s."""
+
+    def __init__(self, models, anweisung, selected_language, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Modelle vergleichen / Compare models')
+        self.resize(1100, 800)
+        self.anweisung = anweisung
+        self.selected_language = selected_language
+        self.worker = None
+        self.panes = {}
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel('Modelle auswählen / Select models:'))
+        self.model_list = QListWidget()
+        self.model_list.setMaximumHeight(150)
+        for model in models:
+            item = QListWidgetItem(model)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Unchecked)
+            self.model_list.addItem(item)
+        layout.addWidget(self.model_list)
+
+        button_row = QHBoxLayout()
+        self.start_button = QPushButton('Vergleichen / Compare')
+        self.start_button.clicked.connect(self.start_comparison)
+        button_row.addWidget(self.start_button)
+        self.cancel_button = QPushButton('Abbrechen / Cancel')
+        self.cancel_button.clicked.connect(self.cancel_comparison)
+        self.cancel_button.setEnabled(False)
+        button_row.addWidget(self.cancel_button)
+        layout.addLayout(button_row)
+
+        self.pane_container = QWidget()
+        self.pane_layout = QGridLayout()
+        self.pane_container.setLayout(self.pane_layout)
+        scroll_area = QScrollArea()
+        scroll_area.setWidgetResizable(True)
+        scroll_area.setWidget(self.pane_container)
+        layout.addWidget(scroll_area)
+        self.setLayout(layout)
+
+    def start_comparison(self):
+        models = [self.model_list.item(i).text() for i in range(self.model_list.count())
+                  if self.model_list.item(i).checkState() == Qt.CheckState.Checked]
+        if not models:
+            QMessageBox.warning(self, 'Fehler', 'Bitte mindestens ein Modell auswählen.\nPlease select at least one model.')
+            return
+
+        # Felder für jedes Modell anlegen (zwei Spalten)
+        while self.pane_layout.count():
+            self.pane_layout.takeAt(0).widget().deleteLater()
+        self.panes = {}
+        for i, model in enumerate(models):
+            label = QLabel(f'{model}: wartet / queued')
+            text_edit = QTextEdit()
+            text_edit.setReadOnly(True)
+            text_edit.setMinimumHeight(250)
+            self.pane_layout.addWidget(label, (i // 2) * 2, i % 2)
+            self.pane_layout.addWidget(text_edit, (i // 2) * 2 + 1, i % 2)
+            self.panes[model] = (label, text_edit)
+
+        target_language = LANGUAGE_MAP.get(self.selected_language, 'en')
+        self.worker = CompareWorker(self.anweisung, self.selected_language, target_language, models, self)
+        self.worker.model_started.connect(self.on_model_started)
+        self.worker.chunk_received.connect(self.on_chunk_received)
+        self.worker.model_finished.connect(self.on_model_finished)
+        self.worker.model_failed.connect(self.on_model_failed)
+        self.worker.finished.connect(self.on_worker_finished)
+        self.start_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.worker.start()
+
+    def cancel_comparison(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_button.setEnabled(False)
+
+    def on_model_started(self, model):
+        self.panes[model][0].setText(f'{model}: läuft / running')
+
+    def on_chunk_received(self, model, text):
+        text_edit = self.panes[model][1]
+        text_edit.moveCursor(QTextCursor.MoveOperation.End)
+        text_edit.insertPlainText(text)
+
+    def on_model_finished(self, model, generated_text, speed):
+        label, text_edit = self.panes[model]
+        text_edit.setPlainText(generated_text)
+        details = [f"TTFT {speed['ttft']:.2f} s" if speed['ttft'] is not None else None,
+                   f"{speed['total']:.1f} s" if speed['total'] is not None else None,
+                   f"{speed['tokens_per_sec']:.1f} tok/s" if speed['tokens_per_sec'] else None,
+                   f"geladen in {speed['load']:.1f} s" if speed['load'] else None]
+        label.setText(f"{model}: " + ' · '.join(detail for detail in details if detail))
+
+    def on_model_failed(self, model, message):
+        self.panes[model][0].setText(f'{model}: Fehler / error – {message}')
+
+    def on_worker_finished(self):
+        self.worker.deleteLater()
+        self.worker = None
+        self.start_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+
+    def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+
+    def closeEvent(self, event):
+        self.stop()
+        super().closeEvent(event)
+
+    def reject(self):
+        # Esc schließt über reject(), nicht über closeEvent
+        self.stop()
+        super().reject()
+
+def paint_transcript(device, session, messages, step):
+    """Setzt ein Gespräch seitenweise auf device (QPdfWriter oder QPrinter); läuft im Export-Thread.
+
+    Die Nachrichten werden in Blöcken zu je PDF_BLOCK_MESSAGES gesetzt, damit
+    nie das ganze Gespräch als ein Textdokument im Speicher liegt; jeder Block
+    beginnt auf einer neuen Seite.
+    """
+    page = device.pageLayout().paintRectPixels(device.resolution())
+    width, height = page.width(), page.height()
+    messages = iter(messages)
+    heading = f"<h2>{html.escape(session_heading(session))}</h2>\n"
+    painter = QPainter()
+    if not painter.begin(device):
+        raise OSError('Die Ausgabe kann nicht geöffnet werden.')
+    try:
+        first_page = True
+        while True:
+            parts = []
+            for message in itertools.islice(messages, PDF_BLOCK_MESSAGES):
+                parts.append(message_html(message))
+                step()
+            if not parts and not heading:
+                break
+            document = QTextDocument()
+            document.documentLayout().setPaintDevice(device)
+            document.setPageSize(QSizeF(width, height))
+            document.setHtml(heading + ''.join(parts))
+            heading = ''
+            for number in range(document.pageCount()):
+                if not first_page:
+                    device.newPage()
+                first_page = False
+                painter.save()
+                painter.translate(0, -number * height)
+                document.drawContents(painter, QRectF(0, number * height, width, height))
+                painter.restore()
+    finally:
+        painter.end()
+
+def write_pdf(path, session, messages, step):
+    writer = QPdfWriter(path)
+    writer.setTitle(session['title'])
+    writer.setResolution(300)
+    writer.setPageLayout(QPageLayout(QPageSize(QPageSize.PageSizeId.A4), QPageLayout.Orientation.Portrait,
+                                     QMarginsF(15, 15, 15, 15), QPageLayout.Unit.Millimeter))
+    paint_transcript(writer, session, messages, step)
+
+EXPORT_WRITERS = {**WRITERS, 'pdf': write_pdf}
+
+class ExportWorker(QThread):
+    """Exportiert oder druckt im Hintergrund; task(on_progress, cancel_event) liefert die geschriebenen Pfade."""
+    progress = Signal(int, int, str)
+    export_finished = Signal(list)
+    export_failed = Signal(str)
+    export_cancelled = Signal()
+
+    def __init__(self, task, parent=None):
+        super().__init__(parent)
+        self.task = task
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            paths = self.task(self.progress.emit, self.cancel_event)
+        except ExportCancelled:
+            self.export_cancelled.emit()
+            return
+        except Exception as e:
+            logging.error(f"Fehler beim Export: {e}")
+            self.export_failed.emit(str(e))
+            return
+        self.export_finished.emit(paths or [])
+
+class HistoryDialog(QDialog):
+    """Gespeicherte Gespräche durchsuchen, fortsetzen und exportieren."""
+    SEARCH_DELAY_MS = 200
+
+    def __init__(self, store, parent=None, on_export=None):
+        super().__init__(parent)
+        self.setWindowTitle('Verlauf / History')
+        self.resize(700, 600)
+        self.store = store
+        self.on_export = on_export  # on_export(session_ids, dialog)
+        self.selected_session_id = None
+
+        layout = QVBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText('Suchen / Search')
+        layout.addWidget(self.search_input)
+
+        self.results = QListWidget()
+        self.results.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)  # Mehrere für den Export
+        self.results.itemDoubleClicked.connect(self.resume_selected)
+        layout.addWidget(self.results)
+
+        button_row = QHBoxLayout()
+        self.resume_button = QPushButton('Fortsetzen / Resume')
+        self.resume_button.clicked.connect(self.resume_selected)
+        button_row.addWidget(self.resume_button)
+
+        self.export_button = QPushButton('Exportieren / Export')
+        self.export_button.clicked.connect(self.export_selected)
+        self.export_button.setEnabled(on_export is not None)
+        button_row.addWidget(self.export_button)
+        layout.addLayout(button_row)
+        self.setLayout(layout)
+
+        # Erst suchen, wenn die Eingabe kurz ruht
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.refresh)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.refresh()
+
+    def refresh(self):
+        self.results.clear()
+        text = self.search_input.text().strip()
+        if text:
+            entries = [(hit['session_id'], f"{hit['title']}: {hit['snippet']}") for hit in self.store.search(text)]
+        else:
+            entries = [(session['id'], f"{time.strftime('%d.%m.%Y %H:%M', time.localtime(session['updated_at']))} – "
+                                       f"{session['title']} ({session['model'] or '?'})")
+                       for session in self.store.list_sessions()]
+        for session_id, label in entries:
+            item = QListWidgetItem(label)
+            item.setData(Qt.ItemDataRole.UserRole, session_id)
+            self.results.addItem(item)
+
+    def resume_selected(self):
+        item = self.results.currentItem()
+        if item is None:
+            return
+        self.selected_session_id = item.data(Qt.ItemDataRole.UserRole)
+        self.accept()
+
+    def export_selected(self):
+        session_ids = [item.data(Qt.ItemDataRole.UserRole) for item in self.results.selectedItems()]
+        if session_ids:
+            self.on_export(list(dict.fromkeys(session_ids)), self)  # Suchtreffer können doppelt vorkommen
+
+class IndexWorker(QThread):
+    """Indexiert Dokumente im Hintergrund (nur geänderte Dateien werden neu eingebettet)."""
+    progress = Signal(int, int)
+    indexing_finished = Signal(int, int)
+    indexing_failed = Signal(str)
+
+    def __init__(self, paths, parent=None):
+        super().__init__(parent)
+        self.paths = paths
+
+    def run(self):
+        try:
+            from rag import get_index  # numpy erst bei Bedarf laden
+            changed, chunks = get_index().index_paths(self.paths, on_progress=self.progress.emit)
+        except Exception as e:
+            logging.error(f"Fehler beim Indexieren: {e}")
+            self.indexing_failed.emit(str(e))
+            return
+        self.indexing_finished.emit(changed, chunks)
+
+class BatchWorker(QThread):
+    """Arbeitet eine Datei mit Anweisungen ab; eigener Scheduler mit `workers` parallelen Einträgen."""
+    progress = Signal(dict)
+    batch_finished = Signal(dict)
+    batch_failed = Signal(str)
+
+    def __init__(self, input_path, output_path, model, language, workers, pipelined, use_cache, parent=None):
+        super().__init__(parent)
+        self.input_path = input_path
+        self.output_path = output_path
+        self.model = model
+        self.language = language
+        self.workers = workers
+        self.pipelined = pipelined
+        self.use_cache = use_cache
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        # Der gemeinsame Scheduler erlaubt nur SCHEDULER_MAX_PER_MODEL pro Modell
+        scheduler = GenerationScheduler(max_workers=self.workers, max_per_model=self.workers)
+        try:
+            result = run_batch(self.input_path, self.output_path, self.model, self.language, self.workers,
+                               self.pipelined, self.use_cache, scheduler, on_progress=self.progress.emit,
+                               cancel_event=self.cancel_event)
+        except Exception as e:
+            logging.error(f"Fehler in der Stapelverarbeitung: {e}")
+            self.batch_failed.emit(str(e))
+            return
+        finally:
+            scheduler.shutdown(wait=False)
+        self.batch_finished.emit(result)
+
+class BatchDialog(QDialog):
+    """Stapelverarbeitung einer JSONL- oder CSV-Datei mit dem gewählten Modell und der gewählten Sprache."""
+
+    def __init__(self, model, language, pipelined, use_cache, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f'Stapelverarbeitung / Batch: {model} ({language})')
+        self.resize(600, 220)
+        self.model = model
+        self.language = language
+        self.pipelined = pipelined
+        self.use_cache = use_cache
+        self.worker = None
+
+        layout = QVBoxLayout()
+        input_row = QHBoxLayout()
+        self.input_edit = QLineEdit()
+        self.input_edit.setPlaceholderText('Eingabe / Input (.jsonl, .csv)')
+        input_row.addWidget(self.input_edit)
+        browse_button = QPushButton('…')
+        browse_button.clicked.connect(self.choose_input)
+        input_row.addWidget(browse_button)
+        layout.addLayout(input_row)
+
+        self.output_edit = QLineEdit()
+        self.output_edit.setPlaceholderText('Ausgabe / Output (.jsonl)')
+        layout.addWidget(self.output_edit)
+
+        workers_row = QHBoxLayout()
+        workers_row.addWidget(QLabel('Gleichzeitig / Parallel:'))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 16)
+        self.workers_spin.setValue(SCHEDULER_MAX_PER_MODEL)
+        workers_row.addWidget(self.workers_spin)
+        workers_row.addStretch(1)
+        layout.addLayout(workers_row)
+
+        self.progress_bar = QProgressBar()
+        layout.addWidget(self.progress_bar)
+        self.progress_label = QLabel('')
+        layout.addWidget(self.progress_label)
+
+        buttons_row = QHBoxLayout()
+        self.start_button = QPushButton('Starten / Start')
+        self.start_button.clicked.connect(self.start)
+        buttons_row.addWidget(self.start_button)
+        self.stop_button = QPushButton('Abbrechen / Cancel')
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop)
+        buttons_row.addWidget(self.stop_button)
+        layout.addLayout(buttons_row)
+        self.setLayout(layout)
+
+    def choose_input(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, 'Eingabe wählen', '', 'Anweisungen (*.jsonl *.csv)')
+        if file_path:
+            self.input_edit.setText(file_path)
+            if not self.output_edit.text():
+                self.output_edit.setText(f"{file_path.rsplit('.', 1)[0]}.ergebnis.jsonl")
+
+    def start(self):
+        input_path = self.input_edit.text().strip()
+        output_path = self.output_edit.text().strip()
+        if not input_path or not output_path:
+            QMessageBox.warning(self, 'Fehler', 'Bitte Ein- und Ausgabedatei angeben.\nPlease choose an input and an output file.')
+            return
+        self.worker = BatchWorker(input_path, output_path, self.model, self.language, self.workers_spin.value(),
+                                  self.pipelined, self.use_cache, self)
+        self.worker.progress.connect(self.show_progress)
+        self.worker.batch_finished.connect(self.on_finished)
+        self.worker.batch_failed.connect(lambda message: QMessageBox.critical(self, 'Fehler', f'Fehler in der Stapelverarbeitung: {message}'))
+        self.worker.finished.connect(self.on_worker_finished)
+        self.start_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+        self.progress_label.setText('Starte / Starting …')
+        self.worker.start()
+
+    def show_progress(self, progress):
+        self.progress_bar.setMaximum(max(1, progress['total']))
+        self.progress_bar.setValue(progress['done'])
+        self.progress_label.setText(format_progress(progress))
+
+    def on_finished(self, result):
+        self.show_progress(result)
+        if result['total'] == 0:
+            self.progress_label.setText(f"Nichts zu tun, {result['skipped']} Einträge sind schon erledigt / Nothing left to do")
+
+    def on_worker_finished(self):
+        worker = self.sender()
+        worker.deleteLater()
+        if worker is self.worker:
+            self.reset_buttons()
+
+    def reset_buttons(self):
+        self.worker = None
+        self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+
+    def stop(self):
+        """Bricht ab; ein erneuter Start mit derselben Ausgabedatei setzt fort."""
+        if self.worker is not None:
+            self.worker.cancel_event.set()
+            self.worker.wait()
+            self.reset_buttons()
+
+    def closeEvent(self, event):
+        self.stop()
+        super().closeEvent(event)
+
+    def reject(self):
+        self.stop()
+        super().reject()
+
+class AutoTuneWorker(QThread):
+    """Misst num_thread/num_batch-Kombinationen für ein Modell und speichert die schnellste."""
+    result_measured = Signal(dict)
+    tune_finished = Signal(dict)
+    tune_failed = Signal(str)
+
+    def __init__(self, model, base, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self.base = base
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            best, _ = tune(self.model, on_result=self.result_measured.emit, cancel_event=self.cancel_event,
+                           base=self.base)
+        except Exception as e:
+            logging.error(f"Fehler beim Abstimmen von {self.model}: {e}")
+            self.tune_failed.emit(str(e))
+            return
+        if best is not None:
+            self.tune_finished.emit(best)
+
+class ModelOptionsDialog(QDialog):
+    """Generierungsoptionen des gewählten Modells bearbeiten oder automatisch abstimmen."""
+    # Option -> (Höchstwert, Schrittweite); 0 = Standard des Servers
+    RANGES = {'num_ctx': (1048576, 1024), 'num_thread': (256, 1), 'num_batch': (8192, 64), 'num_predict': (131072, 64)}
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f'Optionen / Options: {model}')
+        self.resize(520, 300)
+        self.model = model
+        self.worker = None
+
+        layout = QVBoxLayout()
+        grid = QGridLayout()
+        options = get_model_options().get(model)
+        self.spins = {}
+        for row, (key, description) in enumerate(OPTION_KEYS.items()):
+            grid.addWidget(QLabel(f'{key} ({description}):'), row, 0)
+            spin = QSpinBox()
+            maximum, step = self.RANGES[key]
+            spin.setRange(0, maximum)
+            spin.setSingleStep(step)
+            spin.setSpecialValueText('Standard / default')
+            spin.setValue(options.get(key, 0))
+            grid.addWidget(spin, row, 1)
+            self.spins[key] = spin
+        layout.addLayout(grid)
+
+        self.tune_label = QLabel('')
+        self.tune_label.setWordWrap(True)
+        layout.addWidget(self.tune_label)
+
+        buttons_row = QHBoxLayout()
+        self.tune_button = QPushButton('Automatisch abstimmen / Auto-tune')
+        self.tune_button.clicked.connect(self.start_tuning)
+        buttons_row.addWidget(self.tune_button)
+        self.save_button = QPushButton('Speichern / Save')
+        self.save_button.clicked.connect(self.save)
+        buttons_row.addWidget(self.save_button)
+        cancel_button = QPushButton('Abbrechen / Cancel')
+        cancel_button.clicked.connect(self.reject)
+        buttons_row.addWidget(cancel_button)
+        layout.addLayout(buttons_row)
+        self.setLayout(layout)
+
+    def values(self):
+        return {key: spin.value() for key, spin in self.spins.items()}
+
+    def save(self):
+        get_model_options().set(self.model, self.values())
+        self.accept()
+
+    def start_tuning(self):
+        self.worker = AutoTuneWorker(self.model, {key: value for key, value in self.values().items() if value}, self)
+        self.worker.result_measured.connect(self.on_result_measured)
+        self.worker.tune_finished.connect(self.on_tune_finished)
+        self.worker.tune_failed.connect(lambda message: QMessageBox.critical(self, 'Fehler', f'Fehler beim Abstimmen: {message}'))
+        self.worker.finished.connect(self.on_worker_finished)
+        self.tune_button.setEnabled(False)
+        self.save_button.setEnabled(False)
+        self.tune_label.setText('Messe / Measuring …')
+        self.worker.start()
+
+    def on_result_measured(self, result):
+        self.tune_label.setText(format_result(result))
+
+    def on_tune_finished(self, best):
+        for key, value in best.items():
+            self.spins[key].setValue(value)
+        self.tune_label.setText(f"Schnellste / Fastest: num_thread={best['num_thread']}, num_batch={best['num_batch']} "
+                                f"(gespeichert / saved)")
+
+    def on_worker_finished(self):
+        self.worker.deleteLater()
+        self.worker = None
+        self.tune_button.setEnabled(True)
+        self.save_button.setEnabled(True)
+
+    def reject(self):
+        if self.worker is not None:
+            self.worker.cancel_event.set()  # Die laufende Messung wird noch beendet
+            self.worker.wait()
+        super().reject()
 
 class App(QWidget):
-    def __init__(self):
+    def __init__(self, exit_after_startup=False):
         super().__init__()
+        self.exit_after_startup = exit_after_startup  # Für python main.py --startup-report
+        self.first_paint_done = False
+        self.scheduler = get_scheduler()
+        self.chat_jobs = {}  # GenerationWorker -> Job (wartend oder laufend)
+        self.last_submit = 0.0  # Für das Entprellen von Strg+Enter
+        self.streaming = False  # Die letzte Nachricht im Verlauf wird gerade gestreamt
+        self.session_id = None  # Wird mit der ersten Antwort angelegt
+        self.oldest_message_id = None  # Ältere Nachrichten werden beim Hochscrollen nachgeladen
+        self.model_refresh_worker = None
+        self.resident_worker = None
+        self.preloaded_model = None  # Zuletzt vorab geladenes Modell (wird beim Wechsel optional entladen)
+        self.index_worker = None
+        self.export_worker = None
+        self.export_progress = None
+        self.batch_dialog = None
         self.initUI()
-        self.dialog_context = []  # Speichert den gesamten Dialogkontext
-        self.current_interaction = []  # Speichert nur die aktuelle Interaktion
+        self.lifecycle = get_lifecycle()
+        self.model_state_bridge = ModelStateBridge(self)
+        self.model_state_bridge.state_changed.connect(self.on_model_state_changed)
+        self.model_state_listener = self.model_state_bridge.state_changed.emit
+        self.lifecycle.add_listener(self.model_state_listener)
+        self.model_state_timer = QTimer(self)
+        self.model_state_timer.setInterval(MODEL_STATE_POLL_MS)
+        self.model_state_timer.timeout.connect(self.refresh_resident_models)
+        self.load_progress_timer = QTimer(self)  # Aktualisiert die Ladeanzeige, solange das Modell lädt
+        self.load_progress_timer.setInterval(500)
+        self.load_progress_timer.timeout.connect(self.update_model_state)
+        self.session = ChatSession(None)  # Dialogkontext und Einstellungen des laufenden Gesprächs
 
     def initUI(self):
         self.setWindowTitle('2024 / Ollama-Chatbot 2.1 | by Der Zerfleischer on ')
-        self.setFixedSize(800, 890)
+        self.setFixedSize(900, 890)
 
         # Globales Stylesheet für alle Widgets
         self.setStyleSheet("""
@@ -56,6 +882,18 @@ class App(QWidget):
                 border-radius: 10px;
                 background-color: rgb(33, 33, 33);
             }
+            QCheckBox {
+                font-size: 14px;
+                color: rgb(215, 215, 215);
+            }
+            QListView {
+                font-size: 14px;
+                color: rgb(215, 215, 215);
+                padding: 5px;
+                border: 2px solid rgb(31, 84, 30);
+                border-radius: 10px;
+                background-color: rgb(33, 33, 33);
+            }
             QLabel {
                 font-size: 14px;
                 color: rgb(215, 215, 215);
@@ -69,26 +907,47 @@ class App(QWidget):
         self.model_label = QLabel('Ollama Modelle / Ollama models:')
         layout.addWidget(self.model_label)
 
+        model_row = QHBoxLayout()
         self.model_combo = QComboBox()
         self.model_combo.setMinimumHeight(25)
         self.load_models()
-        layout.addWidget(self.model_combo)
+        self.model_combo.currentIndexChanged.connect(self.on_model_selected)
+        model_row.addWidget(self.model_combo, 1)
+
+        self.model_options_button = QPushButton('Optionen / Options')
+        self.model_options_button.clicked.connect(self.open_model_options)
+        model_row.addWidget(self.model_options_button)
+        layout.addLayout(model_row)
 
         # Sprachauswahl
         self.language_label = QLabel('Sprache auswählen / Select Language:')
         layout.addWidget(self.language_label)
 
         self.language_combo = QComboBox()
-        self.language_combo.addItems([
-            'Deutsch',  # de
-            'Englisch',  # en
-            'Französisch',  # fr
-            'Spanisch',  # es
-            'Italienisch',  # it
-            'Lateinisch'  # la
-        ])
+        self.language_combo.addItems(list(LANGUAGE_MAP))
         layout.addWidget(self.language_combo)
 
+        # Antwort schon während der Generierung satzweise übersetzen
+        self.pipelined_checkbox = QCheckBox('Während der Generierung übersetzen / Translate while generating')
+        self.pipelined_checkbox.setChecked(PIPELINED_TRANSLATION)
+        options_row = QHBoxLayout()
+        options_row.addWidget(self.pipelined_checkbox)
+
+        # Ohne Häkchen wird immer neu generiert (z.B. wenn aktuelle Antworten wichtig sind)
+        self.use_cache_checkbox = QCheckBox('Antwort-Cache verwenden / Use response cache')
+        self.use_cache_checkbox.setChecked(RESPONSE_CACHE)
+        options_row.addWidget(self.use_cache_checkbox)
+        layout.addLayout(options_row)
+
+        # Eigene Dokumente als Kontext
+        documents_row = QHBoxLayout()
+        self.use_documents_checkbox = QCheckBox('Eigene Dokumente verwenden / Use my documents')
+        documents_row.addWidget(self.use_documents_checkbox)
+        self.index_button = QPushButton('Dokumente indexieren / Index documents')
+        self.index_button.clicked.connect(self.index_documents)
+        documents_row.addWidget(self.index_button)
+        layout.addLayout(documents_row)
+
         # Eingabe-Anweisung
         self.anweisung_label = QLabel('Anweisung / Instruction:')
         layout.addWidget(self.anweisung_label)
@@ -98,47 +957,202 @@ class App(QWidget):
         self.anweisung_input.installEventFilter(self)
         layout.addWidget(self.anweisung_input)
 
-        # Generate Button
+        # Generate Button und Abbrechen in einer Zeile
+        generate_row = QHBoxLayout()
         self.generate_button = QPushButton('Generieren / Generate')
+        self.generate_button.setMinimumWidth(300)  # Platz für die Ladeanzeige
         self.generate_button.clicked.connect(self.generate_text)
-        layout.addWidget(self.generate_button)
+        generate_row.addWidget(self.generate_button)
+
+        self.cancel_button = QPushButton('Abbrechen / Cancel')
+        self.cancel_button.clicked.connect(self.cancel_generation)
+        self.cancel_button.setEnabled(False)
+        generate_row.addWidget(self.cancel_button)
 
-        # Generierte Antwort
-        self.generated_text_label = QLabel('Aktuelle Antwort / Current response:')
+        self.compare_button = QPushButton('Modelle vergleichen / Compare models')
+        self.compare_button.clicked.connect(self.open_comparison)
+        generate_row.addWidget(self.compare_button)
+        layout.addLayout(generate_row)
+
+        # Gesprächsverlauf: nur sichtbare Nachrichten werden gezeichnet
+        self.generated_text_label = QLabel('Gespräch / Conversation:')
         layout.addWidget(self.generated_text_label)
 
-        self.generated_text_edit = QTextEdit()
-        self.generated_text_edit.setMinimumSize(0, 300)
-        layout.addWidget(self.generated_text_edit)
+        self.transcript_model = TranscriptModel(self)
+        self.transcript_view = QListView()
+        self.transcript_view.setModel(self.transcript_model)
+        self.transcript_view.setItemDelegate(TranscriptDelegate(self.transcript_view))
+        self.transcript_view.setWordWrap(True)
+        self.transcript_view.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.transcript_view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.transcript_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.transcript_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.transcript_view.setBatchSize(100)
+        self.transcript_view.setMinimumSize(0, 300)
+        self.transcript_view.verticalScrollBar().valueChanged.connect(self.on_transcript_scrolled)
+        layout.addWidget(self.transcript_view)
 
-        # Copy to clipboard Button
+        # Copy to clipboard, Drucken und Exportieren in einer Zeile
+        output_row = QHBoxLayout()
         self.copy_to_clipboard_button = QPushButton('In Zwischenablage kopieren / Copy to clipboard')
         self.copy_to_clipboard_button.clicked.connect(self.copy_to_clipboard)
-        layout.addWidget(self.copy_to_clipboard_button)
+        output_row.addWidget(self.copy_to_clipboard_button)
 
-        # Drucken und PDF speichern
         self.print_button = QPushButton('Drucken / Print')
         self.print_button.clicked.connect(self.print_result)
-        layout.addWidget(self.print_button)
+        output_row.addWidget(self.print_button)
 
-        self.save_pdf_button = QPushButton('Als PDF speichern / Save as PDF')
-        self.save_pdf_button.clicked.connect(self.save_as_pdf)
-        layout.addWidget(self.save_pdf_button)
+        self.export_button = QPushButton('Exportieren / Export')
+        self.export_button.clicked.connect(self.export_conversation)
+        output_row.addWidget(self.export_button)
+        layout.addLayout(output_row)
 
         # Konversation zurücksetzen
+        conversation_row = QHBoxLayout()
         self.reset_conversation_button = QPushButton('Neues Gespräch / New conversation')
         self.reset_conversation_button.clicked.connect(self.reset_conversation)
-        layout.addWidget(self.reset_conversation_button)
+        conversation_row.addWidget(self.reset_conversation_button)
+
+        self.history_button = QPushButton('Verlauf / History')
+        self.history_button.clicked.connect(self.open_history)
+        conversation_row.addWidget(self.history_button)
+
+        self.batch_button = QPushButton('Stapel / Batch')
+        self.batch_button.clicked.connect(self.open_batch)
+        conversation_row.addWidget(self.batch_button)
+        layout.addLayout(conversation_row)
+
+        # Statuszeile, rechts die Geschwindigkeit der laufenden bzw. letzten Runde
+        status_row = QHBoxLayout()
+        self.status_label = QLabel('')
+        status_row.addWidget(self.status_label, 1)
+        self.stats_label = QLabel('')
+        status_row.addWidget(self.stats_label)
+        layout.addLayout(status_row)
 
         self.setLayout(layout)
 
+    @property
+    def store(self):
+        """Gesprächsspeicher; die Datenbank wird erst beim ersten Zugriff geöffnet."""
+        return get_store()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.first_paint_done:
+            self.first_paint_done = True
+            startup_timing.mark('Erstes Zeichnen')
+            QTimer.singleShot(0, self.after_first_paint)
+
+    def after_first_paint(self):
+        """Alles, was für das erste Bild nicht nötig ist, startet erst hier."""
+        configure_logging()
+        if METRICS_PORT:
+            try:
+                start_metrics_server(METRICS_PORT)
+            except OSError as e:
+                logging.error(f"Metrik-Endpunkt konnte nicht gestartet werden: {e}")
+        if self.exit_after_startup:
+            startup_timing.print_marks()
+            QApplication.quit()
+            return
+        self.refresh_models()
+        self.refresh_resident_models()
+        self.model_state_timer.start()
+
     def load_models(self):
-        models = get_installed_models()
+        # Sofort die Modelle vom letzten Start anzeigen, danach im Hintergrund aktualisieren
+        self.set_models(get_registry().load_cached())  # Aktualisierung erst nach dem ersten Zeichnen
+
+    def set_models(self, models):
+        selected = self.model_combo.currentText().split(': ')[-1]
+        self.model_combo.blockSignals(True)  # Neu füllen ist kein Modellwechsel
+        self.model_combo.clear()
+        self.model_combo.addItems([f"Modell {i + 1}: {model}" for i, model in enumerate(models)])
+        if selected in models:
+            self.model_combo.setCurrentIndex(models.index(selected))
+        self.model_combo.blockSignals(False)
+
+    def refresh_models(self):
+        if self.model_refresh_worker is not None:
+            return
+        self.model_refresh_worker = ModelRefreshWorker(self)
+        self.model_refresh_worker.models_loaded.connect(self.on_models_loaded)
+        self.model_refresh_worker.start()
+
+    def on_models_loaded(self, models, server_available):
+        self.model_refresh_worker.wait()
+        self.model_refresh_worker.deleteLater()
+        self.model_refresh_worker = None
         if models:
-            self.model_combo.addItems([f"Modell {k}: {v}" for k, v in models.items()])
+            self.set_models(models)
+            self.on_model_selected()
+        elif not server_available:
+            QMessageBox.critical(self, 'Fehler', 'Der Ollama-Server ist nicht erreichbar. Bitte starte Ollama.\nThe Ollama server is not reachable. Please start Ollama.')
         else:
+            self.set_models([])
             QMessageBox.critical(self, 'Fehler', 'Es sind keine Modelle installiert. Installiere bitte mindestens ein Modell.\nNo models are installed. Please install at least one model.')
 
+    def on_model_selected(self):
+        """Lädt das gewählte Modell vorab, damit die erste Anfrage nicht auf das Laden wartet."""
+        if self.model_combo.count() == 0:
+            return
+        model = self.model_combo.currentText().split(': ')[-1]
+        if MODEL_PRELOAD and self.first_paint_done and model != self.preloaded_model:
+            self.lifecycle.preload(model, self.preloaded_model if MODEL_UNLOAD_PREVIOUS else None)
+            self.preloaded_model = model
+        self.update_model_state()
+
+    def open_model_options(self):
+        if self.model_combo.count() == 0:
+            QMessageBox.warning(self, 'Fehler', 'Es ist kein Modell ausgewählt.\nNo model is selected.')
+            return
+        model = self.model_combo.currentText().split(': ')[-1]
+        before = get_model_options().get(model)
+        ModelOptionsDialog(model, self).exec()
+        if get_model_options().get(model) != before:
+            # Geänderte Optionen laden das Modell neu; gleich im Hintergrund erledigen
+            self.lifecycle.invalidate(model)
+            if MODEL_PRELOAD:
+                self.lifecycle.preload(model)
+
+    def on_model_state_changed(self, model, state):
+        if model == self.model_combo.currentText().split(': ')[-1]:
+            self.update_model_state()
+
+    def update_model_state(self):
+        """Zeigt am Generieren-Knopf, ob das gewählte Modell geladen ist."""
+        model = self.model_combo.currentText().split(': ')[-1]
+        state = self.lifecycle.state(model) if model else None
+        progress = self.lifecycle.load_progress(model) if state == LOADING else None
+        if progress is not None:
+            elapsed, expected = progress
+            text = f'Generieren / Generate · lädt / loading {elapsed:.0f} s'
+            if expected:
+                text += f' / ~{expected:.0f} s'
+            self.generate_button.setText(text)
+            self.generate_button.setToolTip(f'{model} wird geladen. / {model} is loading.')
+            self.load_progress_timer.start()
+            return
+        self.load_progress_timer.stop()
+        if state == WARM:
+            self.generate_button.setText('Generieren / Generate · ● bereit / warm')
+            self.generate_button.setToolTip(f'{model} ist geladen. / {model} is loaded.')
+        else:
+            self.generate_button.setText('Generieren / Generate')
+            self.generate_button.setToolTip('')
+
+    def refresh_resident_models(self):
+        if self.resident_worker is not None:
+            return
+        self.resident_worker = ResidentModelsWorker(self)
+        self.resident_worker.finished.connect(self.on_resident_worker_finished)
+        self.resident_worker.start()
+
+    def on_resident_worker_finished(self):
+        self.resident_worker.deleteLater()
+        self.resident_worker = None
+
     def eventFilter(self, source, event):
         if source == self.anweisung_input and event.type() == QEvent.Type.KeyPress:
             if event.key() == Qt.Key.Key_Return and event.modifiers() == Qt.KeyboardModifier.ControlModifier:
@@ -147,9 +1161,19 @@ class App(QWidget):
         return super().eventFilter(source, event)
 
     def generate_text(self):
+        # Entprellen: mehrfaches Drücken kurz hintereinander zählt nur einmal
+        now = time.monotonic()
+        if now - self.last_submit < INPUT_DEBOUNCE_MS / 1000:
+            return
+        self.last_submit = now
+
         self.generate_button.setStyleSheet("background-color: green")
         QTimer.singleShot(100, self.reset_generate_button_color)
 
+        if self.model_combo.count() == 0:
+            QMessageBox.warning(self, 'Fehler', 'Es ist kein Modell ausgewählt.\nNo model is selected.')
+            return
+
         selected_model = self.model_combo.currentText().split(': ')[1]
         selected_language = self.language_combo.currentText()  # Sprache auswählen
         anweisung = self.anweisung_input.toPlainText().strip()
@@ -158,58 +1182,213 @@ class App(QWidget):
             QMessageBox.warning(self, 'Fehler', 'Die Anweisung darf nicht leer sein.\nThe instruction must not be empty')
             return
 
-        # Sprachhinweis hinzufügen und Übersetzungslogik je nach Sprache
-        language_map = {
-            'Deutsch': 'de',
-            'Englisch': 'en',
-            'Französisch': 'fr',
-            'Spanisch': 'es',
-            'Italienisch': 'it',
-            'Lateinisch': 'la'
-        }
-        target_language = language_map.get(selected_language, 'en')  # Standard: Englisch
+        # Übersetzung und Generierung laufen im Scheduler, die Oberfläche bleibt bedienbar
+        self.session.pipelined = self.pipelined_checkbox.isChecked()
+        self.session.use_cache = self.use_cache_checkbox.isChecked()
+        self.session.use_documents = self.use_documents_checkbox.isChecked()
+        worker = GenerationWorker(self.session, anweisung, selected_language, selected_model, self)
+        worker.anweisung_translated.connect(self.on_anweisung_translated)
+        worker.chunk_received.connect(self.on_chunk_received)
+        worker.generation_finished.connect(self.on_generation_finished)
+        worker.generation_cancelled.connect(self.on_generation_cancelled)
+        worker.generation_failed.connect(self.on_generation_failed)
+        worker.status_changed.connect(lambda status, worker=worker: self.on_job_status(worker, status))
+        worker.stats_updated.connect(self.on_stats_updated)
 
-        # Übersetze Benutzeranweisung in die gewünschte Sprache
-        try:
-            anweisung = GoogleTranslator(source='auto', target=target_language).translate(anweisung)
-        except Exception as e:
-            QMessageBox.critical(self, 'Übersetzungsfehler', f'Fehler bei der Übersetzung: {str(e)}')
+        # Ein neuer Auftrag ersetzt noch wartende Aufträge, gleiche Aufträge werden nicht doppelt gestellt
+        job = self.scheduler.submit(
+            worker.run, selected_model, PRIORITY_INTERACTIVE, group='chat',
+            key=(selected_model, selected_language, anweisung), supersede=True,
+            on_status=lambda job, worker=worker: worker.status_changed.emit(job.status)
+        )
+        if job.func != worker.run:
+            worker.deleteLater()  # Derselbe Auftrag wartet oder läuft bereits
             return
+        self.chat_jobs[worker] = job
+        self.cancel_button.setEnabled(True)
+        self.update_job_status()
 
-        # Kontext erstellen
-        context = "\n".join(self.dialog_context) if self.dialog_context else ""
-        prompt = f"{context}\nBitte antworte in {selected_language}.\nBenutzer: {anweisung}\nAI:"
+    def on_job_status(self, worker, status):
+        if status not in (QUEUED, RUNNING):
+            if self.chat_jobs.pop(worker, None) is not None:
+                worker.deleteLater()
+        self.cancel_button.setEnabled(bool(self.chat_jobs))
+        self.update_job_status()
 
-        # Text generieren
-        generated_text = generate_ollama_prompt(prompt, '', selected_model)
+    def update_job_status(self):
+        queued, running = self.scheduler.snapshot()
+        if not queued and not running:
+            self.status_label.setText('')
+            return
+        text = f'Warteschlange / Queue: {len(queued)}'
+        if running:
+            text += ' · Läuft / Running: ' + ', '.join(job.model for job in running)
+        self.status_label.setText(text)
 
-        if generated_text:
-            # Übersetze die Antwort zurück in die gewünschte Sprache (falls nötig)
-            try:
-                generated_text = GoogleTranslator(source='auto', target=target_language).translate(generated_text)
-            except Exception as e:
-                QMessageBox.critical(self, 'Übersetzungsfehler', f'Fehler bei der Übersetzung: {str(e)}')
-                return # Hinzugefügt: Beende die Funktion, wenn die Übersetzung fehlschlägt
+    def on_stats_updated(self, stats):
+        if not self.is_current():
+            return
+        if 'model' not in stats:  # Schätzung während der Generierung
+            self.stats_label.setText(f"≈ {stats['tokens_per_sec']:.1f} Tokens/s · {stats['tokens']} Tokens")
+            return
+        if stats['cache']:
+            self.stats_label.setText('Antwort aus dem Cache / Cached answer')
+            return
+        parts = []
+        if stats['tokens_per_sec'] is not None:
+            parts.append(f"{stats['tokens_per_sec']:.1f} Tokens/s")
+        if stats['tokens']:
+            parts.append(f"{stats['tokens']} Tokens")
+        if stats['first_token'] is not None:
+            parts.append(f"erstes Token {stats['first_token']:.2f} s")
+        if stats['phases'].get('load', 0) >= 0.01:
+            parts.append(f"Laden {stats['phases']['load']:.2f} s")
+        self.stats_label.setText(' · '.join(parts))
+
+    def is_current(self):
+        # Signale von Aufträgen eines zurückgesetzten Gesprächs ignorieren
+        return self.sender() is None or self.sender().session is self.session
 
-            self.dialog_context.append(f"Benutzer: {anweisung}")
-            self.dialog_context.append(f"AI: {generated_text}")
-            self.current_interaction = [f"Benutzer: {anweisung}", f"AI: {generated_text}"]
+    def open_comparison(self):
+        anweisung = self.anweisung_input.toPlainText().strip()
+        if not anweisung:
+            QMessageBox.warning(self, 'Fehler', 'Die Anweisung darf nicht leer sein.\nThe instruction must not be empty')
+            return
+        models = [self.model_combo.itemText(i).split(': ')[1] for i in range(self.model_combo.count())]
+        dialog = CompareDialog(models, anweisung, self.language_combo.currentText(), self)
+        dialog.exec()
 
-            # Set the text and *then* remove the leading quote if present
-            final_text = "\n".join(self.current_interaction)
-            if final_text.startswith('"'):
-                final_text = final_text[1:]
+    def index_documents(self):
+        directory = QFileDialog.getExistingDirectory(self, "Dokumentordner auswählen / Select document folder")
+        if not directory or self.index_worker is not None:
+            return
+        self.index_worker = IndexWorker([directory], self)
+        self.index_worker.progress.connect(
+            lambda done, total: self.status_label.setText(f'Indexiere Dokumente / Indexing documents: {done}/{total}'))
+        self.index_worker.indexing_finished.connect(self.on_indexing_finished)
+        self.index_worker.indexing_failed.connect(
+            lambda message: QMessageBox.critical(self, 'Fehler', f'Fehler beim Indexieren: {message}'))
+        self.index_worker.finished.connect(self.on_index_worker_finished)
+        self.index_button.setEnabled(False)
+        self.status_label.setText('Indexiere Dokumente / Indexing documents …')
+        self.index_worker.start()
 
-            self.generated_text_edit.setPlainText(final_text)
+    def on_indexing_finished(self, changed, chunks):
+        from rag import get_index
+        self.status_label.setText(f'{changed} Dokumente neu indexiert, {len(get_index())} Abschnitte insgesamt / '
+                                  f'{changed} documents indexed, {len(get_index())} chunks in total')
+        self.use_documents_checkbox.setChecked(True)
 
-        else:
-            QMessageBox.critical(self, 'Fehler', 'Fehler bei der Generierung des Textes!')
+    def on_index_worker_finished(self):
+        self.index_worker.deleteLater()
+        self.index_worker = None
+        self.index_button.setEnabled(True)
+
+    def cancel_generation(self):
+        self.scheduler.cancel_group('chat')
+
+    def on_anweisung_translated(self, anweisung):
+        if not self.is_current():
+            return
+        self.transcript_model.append_message('user', anweisung)
+        self.transcript_model.append_message('assistant')
+        self.streaming = True
+        self.transcript_view.scrollToBottom()
+
+    def on_chunk_received(self, text):
+        # Nur die letzte Nachricht ändert sich, der Rest des Verlaufs bleibt unberührt
+        if not self.streaming or not self.is_current():
+            return
+        scrollbar = self.transcript_view.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        self.transcript_model.append_to_last(text)
+        if at_bottom:
+            self.transcript_view.scrollToBottom()
+
+    def on_generation_finished(self, anweisung, generated_text):
+        if not self.is_current():
+            return
+        self.save_turn(anweisung, generated_text)
+
+        cache = self.sender().stats.get('cache') if self.sender() is not None else None
+        self.transcript_model.set_last_text(generated_text, CACHE_NOTES.get(cache, ''))  # Cache-Treffer kennzeichnen
+        self.streaming = False
+
+    def save_turn(self, anweisung, generated_text):
+        # Schreibt im Hintergrund, die Oberfläche wartet nicht
+        if self.session_id is None:
+            self.session_id = self.store.create_session(
+                anweisung, self.model_combo.currentText().split(': ')[-1], self.language_combo.currentText()
+            )
+        self.store.append_message(self.session_id, 'user', anweisung)
+        self.store.append_message(self.session_id, 'assistant', generated_text)
+
+    def open_batch(self):
+        if self.model_combo.count() == 0:
+            QMessageBox.warning(self, 'Fehler', 'Es ist kein Modell ausgewählt.\nNo model is selected.')
+            return
+        if self.batch_dialog is None:
+            self.batch_dialog = BatchDialog(self.model_combo.currentText().split(': ')[-1], self.language_combo.currentText(),
+                                            self.pipelined_checkbox.isChecked(), self.use_cache_checkbox.isChecked(), self)
+            self.batch_dialog.finished.connect(self.on_batch_dialog_closed)
+        self.batch_dialog.show()
+        self.batch_dialog.raise_()
+
+    def on_batch_dialog_closed(self, *args):
+        self.batch_dialog.deleteLater()
+        self.batch_dialog = None
+
+    def open_history(self):
+        dialog = HistoryDialog(self.store, self, on_export=self.export_selected_sessions)
+        if dialog.exec() and dialog.selected_session_id:
+            self.resume_session(dialog.selected_session_id)
+
+    def resume_session(self, session_id):
+        """Lädt ein gespeichertes Gespräch: die letzte Seite in den Verlauf, den Kontext fürs Modell."""
+        self.cancel_generation()
+        self.store.flush()
+        self.session_id = session_id
+        self.streaming = False
+        selected_model = self.model_combo.currentText().split(': ')[-1]
+        self.session = ChatSession(selected_model)
+        self.session.dialog_context.max_tokens = get_registry().context_budget(selected_model)
+        self.store.restore_context(session_id, self.session.dialog_context)
+
+        page = self.store.load_messages(session_id)
+        self.oldest_message_id = None
+        self.transcript_model.clear()
+        self.transcript_model.prepend_messages([(message['role'], message['content']) for message in page])
+        self.oldest_message_id = page[0]['id'] if page else None
+        self.transcript_view.scrollToBottom()
+
+    def on_transcript_scrolled(self, value):
+        if value != self.transcript_view.verticalScrollBar().minimum() or self.session_id is None or self.oldest_message_id is None:
+            return
+        page = self.store.load_messages(self.session_id, self.oldest_message_id)
+        if not page:
+            self.oldest_message_id = None  # Anfang des Gesprächs erreicht
+            return
+        self.oldest_message_id = page[0]['id']
+        self.transcript_model.prepend_messages([(message['role'], message['content']) for message in page])
+        self.transcript_view.scrollTo(self.transcript_model.index(len(page)), QListView.ScrollHint.PositionAtTop)
+
+    def on_generation_cancelled(self):
+        if not self.is_current():
+            return
+        self.on_chunk_received("\n[Abgebrochen / Cancelled]")
+        self.streaming = False
+
+    def on_generation_failed(self, title, message):
+        if self.streaming and self.is_current():
+            self.transcript_model.remove_last(2)  # Unvollständige Runde entfernen
+            self.streaming = False
+        QMessageBox.critical(self, title, message)
 
     def copy_to_clipboard(self):
         self.copy_to_clipboard_button.setStyleSheet("background-color: green")
         QTimer.singleShot(100, self.reset_clipboard_button_color)
 
-        generated_text = self.generated_text_edit.toPlainText()
+        generated_text = self.transcript_model.last_interaction_text()
         if generated_text:
             clipboard = QApplication.clipboard()
             clipboard.setText(generated_text)
@@ -217,26 +1396,94 @@ class App(QWidget):
         else:
             QMessageBox.warning(self, 'Fehler', 'Es gibt keinen generierten Text, der in die Zwischenablage kopiert werden kann.\nThere is no generated text that can be copied to the clipboard.')
 
+    def has_saved_conversation(self):
+        if self.session_id is None:
+            QMessageBox.warning(self, 'Fehler', 'Es gibt noch kein gespeichertes Gespräch.\nThere is no saved conversation yet.')
+            return False
+        return True
+
     def print_result(self):
-        dialog = QPrintDialog()
-        if dialog.exec():
-            printer = dialog.printer()
-            document = QTextDocument()
-            document.setPlainText(self.generated_text_edit.toPlainText())
-            document.print(printer)
+        """Druckt das ganze Gespräch; Seiten werden im Hintergrund gesetzt."""
+        if not self.has_saved_conversation():
+            return
+        from PySide6.QtPrintSupport import QPrinter, QPrintDialog  # Druckunterstützung erst bei Bedarf laden
+        printer = QPrinter(QPrinter.PrinterMode.HighResolution)
+        if not QPrintDialog(printer, self).exec():
+            return
+        store, session_id = self.store, self.session_id
+        render = lambda session, messages, step: paint_transcript(printer, session, messages, step)
+        self.start_export(lambda on_progress, cancel_event: render_session(store, session_id, render, on_progress,
+                                                                           cancel_event))
 
-    def save_as_pdf(self):
-        file_path, _ = QFileDialog.getSaveFileName(self, "Als PDF speichern", "", "PDF-Dateien (*.pdf)")
-        if file_path:
-            printer = QPrinter()
-            printer.setOutputFormat(QPrinter.OutputFormat.PdfFormat)
-            printer.setOutputFileName(file_path)
+    def export_conversation(self):
+        """Exportiert das ganze Gespräch; das Format folgt aus Dateiendung oder Filter."""
+        if not self.has_saved_conversation():
+            return
+        store, session_id = self.store, self.session_id
+        store.flush()  # Das Gespräch wird mit der ersten Antwort im Hintergrund angelegt
+        filters = [f"{label} (*.{fmt})" for fmt, label in FORMATS.items()]
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, 'Exportieren / Export', export_filename(store.get_session(session_id), 'pdf'), ';;'.join(filters)
+        )
+        if not file_path:
+            return
+        fmt = file_path.rsplit('.', 1)[-1].lower()
+        if fmt not in FORMATS:
+            fmt = list(FORMATS)[filters.index(selected_filter)] if selected_filter in filters else 'pdf'
+            file_path = f"{file_path}.{fmt}"
+        self.start_export(lambda on_progress, cancel_event: export_sessions(
+            store, [(session_id, file_path)], fmt, EXPORT_WRITERS, on_progress, cancel_event
+        ))
 
-            document = QTextDocument()
-            document.setPlainText(self.generated_text_edit.toPlainText())
-            document.print(printer)
+    def export_selected_sessions(self, session_ids, parent):
+        """Export mehrerer Gespräche aus dem Verlauf, je eine Datei in einem Verzeichnis."""
+        directory = QFileDialog.getExistingDirectory(parent, 'Exportieren nach / Export to')
+        if not directory:
+            return
+        label, ok = QInputDialog.getItem(parent, 'Format', 'Format:', list(FORMATS.values()), 0, False)
+        if not ok:
+            return
+        fmt = next(fmt for fmt, fmt_label in FORMATS.items() if fmt_label == label)
+        store = self.store
+        self.start_export(lambda on_progress, cancel_event: export_sessions(
+            store, bulk_targets(store, session_ids, directory, fmt), fmt, EXPORT_WRITERS, on_progress, cancel_event
+        ), parent)
+
+    def start_export(self, task, parent=None):
+        if self.export_worker is not None:
+            QMessageBox.information(parent or self, 'Export', 'Es läuft bereits ein Export.\nAn export is already running.')
+            return
+        self.export_progress = QProgressDialog('Exportieren … / Exporting …', 'Abbrechen / Cancel', 0, 0, parent or self)
+        self.export_progress.setWindowTitle('Export')
+        self.export_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.export_progress.setMinimumDuration(300)
+        self.export_worker = ExportWorker(task, self)
+        self.export_progress.canceled.connect(self.export_worker.cancel_event.set)
+        self.export_worker.progress.connect(self.on_export_progress)
+        self.export_worker.export_finished.connect(self.on_export_finished)
+        self.export_worker.export_failed.connect(
+            lambda message: QMessageBox.critical(self, 'Fehler beim Export', message))
+        self.export_worker.finished.connect(self.on_export_worker_finished)
+        self.export_worker.start()
 
-            QMessageBox.information(self, "Erfolg", "Die Datei wurde erfolgreich gespeichert!")
+    def on_export_progress(self, done, total, title):
+        if self.export_progress is None or self.export_progress.wasCanceled():
+            return
+        self.export_progress.setMaximum(total)
+        self.export_progress.setValue(done)
+        if title:
+            self.export_progress.setLabelText(f"{title}\n{done}/{total} Nachrichten / messages")
+
+    def on_export_finished(self, paths):
+        if paths:
+            QMessageBox.information(self, 'Erfolg', f"{len(paths)} Datei(en) exportiert.\n{len(paths)} file(s) exported.")
+
+    def on_export_worker_finished(self):
+        self.export_progress.close()
+        self.export_progress.deleteLater()
+        self.export_progress = None
+        self.export_worker.deleteLater()
+        self.export_worker = None
 
     def reset_generate_button_color(self):
         self.generate_button.setStyleSheet("")
@@ -244,16 +1491,41 @@ class App(QWidget):
     def reset_clipboard_button_color(self):
         self.copy_to_clipboard_button.setStyleSheet("")
 
+    def closeEvent(self, event):
+        if self.batch_dialog is not None:
+            self.batch_dialog.stop()
+        self.scheduler.shutdown()
+        if self.model_refresh_worker is not None:
+            self.model_refresh_worker.wait()
+        self.lifecycle.remove_listener(self.model_state_listener)
+        self.model_state_timer.stop()
+        if self.resident_worker is not None:
+            self.resident_worker.wait()
+        if self.index_worker is not None:
+            self.index_worker.wait()
+        if self.export_worker is not None:
+            self.export_worker.cancel_event.set()
+            self.export_worker.wait()
+        super().closeEvent(event)
+
     def reset_conversation(self):
         """Setzt die Konversation zurück und leert die Historie."""
-        self.dialog_context = []
-        self.current_interaction = []
-        self.generated_text_edit.clear()
+        self.cancel_generation()
+        self.session = ChatSession(None)  # Laufende Aufträge behalten die alte Sitzung
+        self.transcript_model.clear()
+        self.session_id = None
+        self.oldest_message_id = None
         self.anweisung_input.clear()
         QMessageBox.information(self, "Gespräch zurückgesetzt", "Das Gespräch wurde erfolgreich zurückgesetzt.")
 
 if __name__ == '__main__':
+    if '--startup-report' in sys.argv:
+        sys.exit(startup_timing.run_report(__file__))
     app = QApplication(sys.argv)
-    ex = App()
+    app.aboutToQuit.connect(close_client)
+    app.aboutToQuit.connect(close_store)
+    startup_timing.mark('QApplication')
+    ex = App(exit_after_startup='--startup-exit' in sys.argv)
+    startup_timing.mark('Fenster aufgebaut')
     ex.show()
     sys.exit(app.exec())
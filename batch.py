@@ -0,0 +1,204 @@
+"""Stapelverarbeitung: eine Datei mit Anweisungen durch dieselbe Pipeline schicken.
+
+Eingabe: JSONL (Objekte mit "text", optional "id") oder CSV (Spalte "text",
+sonst die erste Spalte; optional Spalte "id"). Jede Anweisung läuft als eigene
+Runde ohne gemeinsamen Kontext über chat_core.ChatSession, also mit derselben
+Übersetzung und Nachbearbeitung wie in der Oberfläche. Ergebnisse werden
+sofort als JSON-Zeilen an die Ausgabedatei angehängt; ein erneuter Aufruf mit
+derselben Ausgabedatei überspringt bereits erfolgreiche Einträge.
+
+    python batch.py fragen.jsonl antworten.jsonl --model llama3.2 --language Deutsch --workers 2
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from chat_core import ChatSession, LANGUAGE_MAP
+from config import SCHEDULER_MAX_PER_MODEL, RESPONSE_CACHE
+from pipeline import PipelineError
+from scheduler import GenerationScheduler, get_scheduler, PRIORITY_BACKGROUND
+from telemetry import configure_logging, build_span
+
+def read_items(path):
+    """Liefert [{'id': str, 'text': str}, ...]; ohne id zählt die Zeilennummer."""
+    items = []
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            reader = csv.DictReader(f)
+            text_column = 'text' if 'text' in (reader.fieldnames or []) else (reader.fieldnames or [None])[0]
+            for number, row in enumerate(reader, 1):
+                items.append({'id': str(row.get('id') or number), 'text': (row.get(text_column) or '').strip()})
+        else:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if isinstance(entry, str):
+                    entry = {'text': entry}
+                items.append({'id': str(entry.get('id', number)), 'text': (entry.get('text') or '').strip()})
+    return [item for item in items if item['text']]
+
+def completed_ids(path):
+    """Ids, die in einer früheren Ausgabe bereits erfolgreich sind (für die Fortsetzung)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Abgebrochene letzte Zeile
+            if record.get('status') == 'ok':
+                done.add(str(record['id']))
+    return done
+
+class BatchProgress:
+    """Zählt erledigte Einträge; liefert Durchsatz und Restzeit (threadsicher)."""
+
+    def __init__(self, total, skipped):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.tokens = 0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.done += 1
+            if record['status'] != 'ok':
+                self.failed += 1
+            self.tokens += (record.get('span') or {}).get('tokens') or 0
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.perf_counter() - self.started
+            rate = self.done / elapsed if elapsed > 0 else 0.0
+            return {
+                'total': self.total,
+                'done': self.done,
+                'failed': self.failed,
+                'skipped': self.skipped,
+                'elapsed': elapsed,
+                'items_per_sec': rate,
+                'tokens_per_sec': self.tokens / elapsed if elapsed > 0 else 0.0,
+                'eta': (self.total - self.done) / rate if rate > 0 else None,
+            }
+
+def format_progress(progress):
+    eta = progress['eta']
+    eta_text = f"{int(eta // 60)}:{int(eta % 60):02d}" if eta is not None else '–'
+    return (f"{progress['done']}/{progress['total']} ({progress['failed']} Fehler) · "
+            f"{progress['items_per_sec']:.2f}/s · {progress['tokens_per_sec']:.1f} Tokens/s · Rest {eta_text}")
+
+def run_batch(input_path, output_path, model, language, workers=SCHEDULER_MAX_PER_MODEL, pipelined=False,
+              use_cache=RESPONSE_CACHE, scheduler=None, on_progress=None, cancel_event=None):
+    """Verarbeitet alle offenen Einträge; blockiert bis zum Ende und liefert den letzten Fortschritt.
+
+    Höchstens `workers` Einträge sind gleichzeitig beim Scheduler; dort laufen
+    sie mit niedriger Priorität und ohne Gruppe, also parallel bis zum
+    max_per_model des Schedulers.
+    Abgebrochene Einträge werden nicht geschrieben und beim nächsten Aufruf nachgeholt.
+    """
+    if language not in LANGUAGE_MAP:
+        raise ValueError(f"Unbekannte Sprache: {language}")
+    items = read_items(input_path)
+    done = completed_ids(output_path)
+    pending = [item for item in items if item['id'] not in done]
+    scheduler = scheduler or get_scheduler()
+    progress = BatchProgress(len(pending), len(items) - len(pending))
+    slots = threading.Semaphore(max(1, workers))
+    outstanding = threading.Condition()
+    running = [0]
+    submitted = []  # Eigene Jobs ohne Gruppe, sonst liefe pro Gruppe nur einer
+    write_lock = threading.Lock()
+    cancelled = lambda: cancel_event is not None and cancel_event.is_set()
+
+    with open(output_path, 'a', encoding='utf-8') as out:
+        def process(item, job_cancel_event):
+            # Läuft in einem Thread des Schedulers
+            stats = {}
+            session = ChatSession(model, language, pipelined=pipelined, use_cache=use_cache)
+            try:
+                result = session.run_turn(item['text'], cancel_event=job_cancel_event, stats=stats)
+            except PipelineError as e:
+                record = {'id': item['id'], 'input': item['text'], 'status': 'failed', 'error': f"{e.title}: {e.message}"}
+            else:
+                if result is None:
+                    return
+                record = {'id': item['id'], 'input': item['text'], 'status': 'ok', 'anweisung': result[0],
+                          'output': result[1], 'span': build_span(model, stats)}
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                out.flush()
+            progress.add(record)
+            if on_progress is not None:
+                on_progress(progress.snapshot())
+
+        def job_status(job):
+            if job.finished:
+                slots.release()
+                with outstanding:
+                    running[0] -= 1
+                    outstanding.notify_all()
+
+        try:
+            for item in pending:
+                while not cancelled() and not slots.acquire(timeout=0.1):
+                    pass
+                if cancelled():
+                    break
+                with outstanding:
+                    running[0] += 1
+                submitted.append(scheduler.submit(
+                    lambda job_cancel_event, item=item: process(item, job_cancel_event), model,
+                    PRIORITY_BACKGROUND, on_status=job_status
+                ))
+            with outstanding:
+                while running[0] and not cancelled():
+                    outstanding.wait(0.1)
+        finally:
+            # Bei Abbruch (auch Strg+C) laufende Einträge beenden, bevor die Datei geschlossen wird
+            if running[0]:
+                for job in submitted:
+                    if not job.finished:
+                        scheduler.cancel(job)
+            with outstanding:
+                while running[0]:
+                    outstanding.wait(0.1)
+    return progress.snapshot()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Anweisungen aus einer JSONL- oder CSV-Datei stapelweise verarbeiten.')
+    parser.add_argument('input', help='Eingabe (.jsonl oder .csv)')
+    parser.add_argument('output', help='Ausgabe (.jsonl); vorhandene Ergebnisse werden übersprungen')
+    parser.add_argument('--model', required=True)
+    parser.add_argument('--language', default='Deutsch', choices=list(LANGUAGE_MAP))
+    parser.add_argument('--workers', type=int, default=max(2, SCHEDULER_MAX_PER_MODEL),
+                        help='Gleichzeitige Anfragen (passend zu OLLAMA_NUM_PARALLEL des Servers)')
+    parser.add_argument('--pipelined', action='store_true', help='Satzweise während der Generierung übersetzen')
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false', help='Antwort-Cache umgehen')
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    scheduler = GenerationScheduler(max_workers=args.workers, max_per_model=args.workers)
+    report = lambda progress: print(f"\r{format_progress(progress)}", end='', file=sys.stderr, flush=True)
+    try:
+        result = run_batch(args.input, args.output, args.model, args.language, args.workers, args.pipelined,
+                           args.use_cache, scheduler, on_progress=report)
+    except KeyboardInterrupt:
+        print("\nAbgebrochen; ein erneuter Aufruf setzt fort.", file=sys.stderr)
+        return 1
+    finally:
+        scheduler.shutdown(wait=False)
+    print(f"\n{result['done']} verarbeitet, {result['failed']} Fehler, {result['skipped']} übersprungen "
+          f"in {result['elapsed']:.1f} s.", file=sys.stderr)
+    return 0 if result['failed'] == 0 else 2
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""Benchmark ohne Oberfläche: misst eine Gesprächsrunde wie App.generate_text.
+
+Standardmäßig läuft alles offline gegen einen lokalen Fake-Ollama-Server und
+einen Fake-Übersetzer mit fester Latenz. Gemessen werden Time-to-first-token,
+Gesamtdauer, Tokens/s, die Dauer der einzelnen Schritte und der Speicher –
+für verschiedene Gesprächslängen und Nebenläufigkeiten. Das Ergebnis wird als
+JSON geschrieben und kann mit --compare gegen einen früheren Lauf verglichen werden.
+
+Beispiel:
+    python benchmark.py --turns 1,5,20 --concurrency 1,4 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import CONTEXT_BUDGET_TOKENS, LOG_PATH
+from dialog_context import DialogContext
+from ollama_client import set_host
+from pipeline import run_turn
+from telemetry import configure_logging
+from translation import Translator
+
+FAKE_MODEL = 'fake-model:latest'
+FAKE_WORDS = ('the', 'model', 'answers', 'quickly', 'and', 'this', 'is', 'a', 'good', 'result', 'for', 'you')
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Beantwortet /api/chat, /api/generate, /api/tags, /api/show und /api/ps wie Ollama."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json({'models': [{
+                'model': FAKE_MODEL, 'name': FAKE_MODEL, 'digest': 'fake', 'size': 0, 'modified_at': None,
+                'details': {'family': 'fake', 'parameter_size': '0B', 'quantization_level': 'none'}
+            }]})
+        elif self.path == '/api/ps':
+            with self.server.lock:
+                loaded = list(self.server.loaded)
+            self._send_json({'models': [{'model': model, 'name': model, 'expires_at': '2099-01-01T00:00:00Z'}
+                                        for model in loaded]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path == '/api/show':
+            self._send_json({'model_info': {'fake.context_length': CONTEXT_BUDGET_TOKENS}})
+        elif self.path in ('/api/chat', '/api/generate'):
+            self._stream(request, chat=self.path == '/api/chat')
+        else:
+            self.send_error(404)
+
+    def _stream(self, request, chat):
+        server = self.server
+        prompt = json.dumps(request.get('messages')) if chat else request.get('prompt', '')
+        if request.get('keep_alive') == 0 and not prompt:
+            with server.lock:
+                server.loaded.discard(request.get('model'))  # Entladen
+            self._send_json(self._chunk(request, '', chat, done=True))
+            return
+        options = request.get('options') or {}
+        with server.lock:
+            load = server.load_delay if request.get('model') not in server.loaded else 0
+            server.loaded.add(request.get('model'))
+            server.last_options = options
+        time.sleep(load)
+        tokens = min(server.tokens, options.get('num_predict') or server.tokens)
+
+        # Prefill nur für den Teil, der nicht mit der letzten Anfrage übereinstimmt (KV-Cache)
+        with server.lock:
+            cached = len(os.path.commonprefix([server.last_prompt, prompt]))
+            server.last_prompt = prompt
+        prompt_tokens = (len(prompt) - cached + 3) // 4
+        prefill = server.first_token_delay + prompt_tokens * server.prefill_delay_per_token
+        time.sleep(prefill)
+
+        if not request.get('stream', True):
+            # Ohne Stream: leerer Prompt lädt nur das Modell, sonst die ganze Antwort auf einmal
+            tokens = 0 if not chat and not prompt else tokens
+            time.sleep(tokens * server.token_delay)
+            text = ''.join(FAKE_WORDS[i % len(FAKE_WORDS)] + ' ' for i in range(tokens))
+            response = self._chunk(request, text, chat, done=True)
+            response.update({
+                'load_duration': int(load * 1e9),
+                'prompt_eval_count': prompt_tokens,
+                'prompt_eval_duration': int(prefill * 1e9),
+                'eval_count': tokens,
+                'eval_duration': int(tokens * server.token_delay * 1e9),
+            })
+            self._send_json(response)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        decode_started = time.perf_counter()
+        for i in range(tokens):
+            word = FAKE_WORDS[i % len(FAKE_WORDS)] + ('. ' if i % 10 == 9 else ' ')
+            self._write_chunk(self._chunk(request, word, chat, done=False))
+            time.sleep(server.token_delay)
+        decode = time.perf_counter() - decode_started
+        final = self._chunk(request, '', chat, done=True)
+        final.update({
+            'total_duration': int((load + prefill + decode) * 1e9),
+            'load_duration': int(load * 1e9),
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': int(prefill * 1e9),
+            'eval_count': tokens,
+            'eval_duration': int(decode * 1e9),
+        })
+        self._write_chunk(final)
+        self.wfile.write(b'0\r\n\r\n')
+
+    @staticmethod
+    def _chunk(request, text, chat, done):
+        chunk = {'model': request.get('model'), 'created_at': '2024-01-01T00:00:00Z', 'done': done}
+        if chat:
+            chunk['message'] = {'role': 'assistant', 'content': text}
+        else:
+            chunk['response'] = text
+        return chunk
+
+    def _write_chunk(self, payload):
+        data = json.dumps(payload).encode('utf-8') + b'\n'
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Abgebrochene Streams schließen die Verbindung; das ist hier kein Fehler
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+def start_fake_server(tokens, token_delay, first_token_delay, prefill_delay_per_token, load_delay=0.0):
+    server = FakeOllamaServer(('127.0.0.1', 0), FakeOllamaHandler)
+    server.load_delay = load_delay  # Einmalig pro Modell, bis es entladen wird
+    server.loaded = set()
+    server.tokens = tokens
+    server.token_delay = token_delay
+    server.first_token_delay = first_token_delay
+    server.prefill_delay_per_token = prefill_delay_per_token
+    server.last_prompt = ''
+    server.last_options = {}
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class FakeTranslationBackend:
+    """Übersetzer-Ersatz mit fester Latenz pro Aufruf; der Text bleibt unverändert."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def translate_batch(self, texts, target):
+        time.sleep(self.delay)
+        return list(texts)
+
+def run_session(turns, args, translator, results):
+    """Eine Sitzung mit `turns` Runden; gemessen wird nur die letzte Runde."""
+    context = DialogContext()
+    for turn in range(turns):
+        stats = {}
+        started = time.perf_counter()
+        result = run_turn(
+            f"Frage Nummer {turn}: Wie schnell ist das Modell?", args.language, args.target, args.model, context,
+            pipelined=args.pipelined, translator=translator, stats=stats
+        )
+        stats['total'] = time.perf_counter() - started
+        if result is None:
+            raise RuntimeError('Runde wurde abgebrochen')
+        anweisung, generated_text = result
+        context.add_user(anweisung)
+        context.add_assistant(generated_text)
+    results.append(stats)
+
+def percentiles(values):
+    values = sorted(values)
+    return {
+        'mean': statistics.fmean(values),
+        'p50': values[len(values) // 2],
+        'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+    }
+
+def run_scenario(turns, concurrency, args, translator):
+    samples = []
+    if args.memory:
+        tracemalloc.start()
+    for _ in range(args.repeat):
+        threads = [threading.Thread(target=run_session, args=(turns, args, translator, samples)) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    peak_python = tracemalloc.get_traced_memory()[1] if args.memory else None
+    if args.memory:
+        tracemalloc.stop()
+    if len(samples) != args.repeat * concurrency:
+        raise RuntimeError(f'Nicht alle Sitzungen wurden abgeschlossen (siehe {LOG_PATH})')
+
+    ms = lambda key: percentiles([sample.get(key, 0.0) * 1000 for sample in samples])
+    tokens_per_sec = [
+        sample['eval_count'] / (sample['eval_duration'] / 1e9)
+        for sample in samples if sample.get('eval_count') and sample.get('eval_duration')
+    ]
+    return {
+        'turns': turns,
+        'concurrency': concurrency,
+        'samples': len(samples),
+        'ttft_ms': ms('first_token'),
+        'first_translated_ms': ms('first_segment'),
+        'total_ms': ms('total'),
+        'tokens_per_sec': percentiles(tokens_per_sec) if tokens_per_sec else None,
+        'stages_ms': {
+            'translate_in': ms('translate_in'),
+            'prefill': percentiles([(sample.get('prompt_eval_duration') or 0) / 1e6 for sample in samples]),
+            'decode': percentiles([(sample.get('eval_duration') or 0) / 1e6 for sample in samples]),
+            'translate_out': ms('translate_out'),
+        },
+        'prompt_tokens': percentiles([sample.get('prompt_eval_count') or 0 for sample in samples]),
+        'peak_python_mb': peak_python / 2**20 if peak_python is not None else None,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == 'darwin' else 2**10),
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(previous_path, report):
+    """Gibt die Veränderung gegenüber einem früheren Lauf aus (positiv = langsamer)."""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {(r['turns'], r['concurrency']): r for r in json.load(f)['results']}
+    for result in report['results']:
+        old = previous.get((result['turns'], result['concurrency']))
+        if old is None:
+            continue
+        for key in ('ttft_ms', 'first_translated_ms', 'total_ms'):
+            before, after = old[key]['p50'], result[key]['p50']
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"turns={result['turns']:>3} concurrency={result['concurrency']:>2} {key:<20} "
+                  f"{before:9.1f} -> {after:9.1f} ms ({change:+.1f} %)")
+
+def parse_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark für die Chatbot-Pipeline ohne Oberfläche.')
+    parser.add_argument('--turns', type=parse_list, default=[1, 5, 20], help='Gesprächslängen, z.B. 1,5,20')
+    parser.add_argument('--concurrency', type=parse_list, default=[1, 4], help='Gleichzeitige Sitzungen, z.B. 1,4')
+    parser.add_argument('--repeat', type=int, default=3, help='Wiederholungen pro Szenario')
+    parser.add_argument('--tokens', type=int, default=64, help='Tokens pro Antwort (Fake-Server)')
+    parser.add_argument('--token-delay', type=float, default=0.005, help='Sekunden pro Token (Fake-Server)')
+    parser.add_argument('--first-token-delay', type=float, default=0.05, help='Grundlatenz bis zum ersten Token (Fake-Server)')
+    parser.add_argument('--prefill-delay', type=float, default=0.0002, help='Sekunden pro ungecachtem Prompt-Token (Fake-Server)')
+    parser.add_argument('--translate-delay', type=float, default=0.03, help='Sekunden pro Übersetzungsaufruf (Fake-Übersetzer)')
+    parser.add_argument('--no-pipelined', dest='pipelined', action='store_false', help='Antwort erst nach der Generierung übersetzen')
+    parser.add_argument('--memory', action='store_true', help='Python-Speicher mit tracemalloc messen (verlangsamt)')
+    parser.add_argument('--host', help='Echten Ollama-Server statt Fake-Server verwenden')
+    parser.add_argument('--model', default=FAKE_MODEL)
+    parser.add_argument('--language', default='Deutsch')
+    parser.add_argument('--target', default='de')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', help='Früheres Ergebnis (JSON) zum Vergleich')
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    server = None
+    if args.host:
+        set_host(args.host)
+    else:
+        server = start_fake_server(args.tokens, args.token_delay, args.first_token_delay, args.prefill_delay)
+        set_host(f"http://127.0.0.1:{server.server_address[1]}")
+    translator = Translator(backend=FakeTranslationBackend(args.translate_delay), cache=None)
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'results': [],
+    }
+    try:
+        for turns in args.turns:
+            for concurrency in args.concurrency:
+                result = run_scenario(turns, concurrency, args, translator)
+                report['results'].append(result)
+                print(f"turns={turns:>3} concurrency={concurrency:>2} "
+                      f"ttft={result['ttft_ms']['p50']:8.1f} ms  "
+                      f"total={result['total_ms']['p50']:8.1f} ms  "
+                      f"tok/s={result['tokens_per_sec']['p50'] if result['tokens_per_sec'] else 0:7.1f}")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Ergebnis gespeichert: {args.output}")
+    if args.compare:
+        compare(args.compare, report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Gesprächslogik ohne Oberfläche.
+
+Eine ChatSession bündelt Modell, Sprache, Dialogkontext und Einstellungen
+einer Unterhaltung; run_turn() führt eine Runde über pipeline.run_turn aus
+(Übersetzung, Kontext, Generierung, Nachbearbeitung) und hängt das Ergebnis
+an den eigenen Kontext an. Runden derselben Sitzung laufen nacheinander,
+verschiedene Sitzungen teilen nichts außer Client, Caches und Scheduler.
+Die Qt-Oberfläche und der HTTP-Server (server.py) sind Clients dieses Moduls.
+"""
+import threading
+import time
+import uuid
+from config import PIPELINED_TRANSLATION, RESPONSE_CACHE
+from dialog_context import DialogContext
+from model_lifecycle import get_lifecycle
+from model_options import get_model_options, limit_budget
+from model_registry import get_registry
+from pipeline import run_turn
+from response_cache import get_response_cache
+
+# Sprachhinweis und Übersetzungslogik je nach Sprache
+LANGUAGE_MAP = {
+    'Deutsch': 'de',
+    'Englisch': 'en',
+    'Französisch': 'fr',
+    'Spanisch': 'es',
+    'Italienisch': 'it',
+    'Lateinisch': 'la'
+}
+
+class ChatSession:
+    def __init__(self, model, language='Deutsch', pipelined=PIPELINED_TRANSLATION, use_cache=RESPONSE_CACHE,
+                 use_documents=False, session_id=None):
+        if language not in LANGUAGE_MAP:
+            raise ValueError(f"Unbekannte Sprache: {language}")
+        self.id = session_id or uuid.uuid4().hex
+        self.model = model
+        self.language = language
+        self.pipelined = pipelined
+        self.use_cache = use_cache
+        self.use_documents = use_documents
+        self.dialog_context = DialogContext()
+        self.last_used = time.monotonic()
+        self._turn_lock = threading.Lock()
+
+    @property
+    def target_language(self):
+        return LANGUAGE_MAP[self.language]
+
+    @property
+    def busy(self):
+        return self._turn_lock.locked()
+
+    def run_turn(self, anweisung, model=None, language=None, on_anweisung=None, on_chunk=None, on_segment=None,
+                 cancel_event=None, stats=None):
+        """Eine Runde (blockierend, für Worker-Threads); Rückgabe wie pipeline.run_turn.
+
+        model und language überschreiben die Einstellungen der Sitzung für
+        diese Runde. Eine zweite Runde derselben Sitzung wartet, bis die
+        erste fertig ist, damit sie deren Antwort im Kontext sieht.
+        """
+        model = model or self.model
+        language = language or self.language
+        with self._turn_lock:
+            context = self.dialog_context  # reset() während der Runde trifft die nächste Runde
+            options = get_model_options().get(model)
+            # An die Kontextlänge des Modells bzw. num_ctx aus dem Profil anpassen
+            context.max_tokens = limit_budget(options, get_registry().context_budget(model))
+            retriever = None
+            if self.use_documents:
+                from rag import get_index  # numpy erst bei Bedarf laden
+                retriever = get_index().build_context
+            try:
+                result = run_turn(
+                    anweisung, language, LANGUAGE_MAP[language], model, context,
+                    on_anweisung=on_anweisung, on_chunk=on_chunk, on_segment=on_segment, cancel_event=cancel_event,
+                    pipelined=self.pipelined, stats=stats, retriever=retriever,
+                    response_cache=get_response_cache() if self.use_cache else None, options=options
+                )
+                if result is None or (cancel_event is not None and cancel_event.is_set()):
+                    return None
+                if not (stats or {}).get('cache'):
+                    get_lifecycle().touch(model)  # Nach einer Runde ist das Modell geladen
+                context.add_user(result[0])
+                context.add_assistant(result[1])
+                return result
+            finally:
+                self.last_used = time.monotonic()
+
+    def reset(self):
+        """Beginnt ein neues Gespräch; eine laufende Runde schreibt noch in den alten Kontext."""
+        self.dialog_context = DialogContext()
+
+    def info(self):
+        return {
+            'id': self.id,
+            'model': self.model,
+            'language': self.language,
+            'pipelined': self.pipelined,
+            'use_cache': self.use_cache,
+            'use_documents': self.use_documents,
+            'busy': self.busy,
+            'tokens': self.dialog_context.total_tokens,
+            'messages': [{'role': message['role'], 'content': message['content']}
+                         for message in self.dialog_context.messages if message['role'] != 'system'],
+        }
+
+class SessionManager:
+    """Sitzungen mehrerer Clients; unbenutzte Sitzungen verfallen."""
+
+    def __init__(self, max_sessions, max_idle):
+        self.max_sessions = max_sessions
+        self.max_idle = max_idle
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, **settings):
+        session = ChatSession(**settings)
+        with self._lock:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                raise RuntimeError('Zu viele offene Sitzungen')
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def remove(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def expire(self):
+        with self._lock:
+            return self._expire()
+
+    def _expire(self):
+        limit = time.monotonic() - self.max_idle
+        expired = [session_id for session_id, session in self._sessions.items()
+                   if session.last_used < limit and not session.busy]
+        for session_id in expired:
+            del self._sessions[session_id]
+        return expired
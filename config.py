@@ -0,0 +1,99 @@
+"""Zentrale Einstellungen. Alle Werte lassen sich über Umgebungsvariablen überschreiben."""
+import os
+
+def _duration(value):
+    """Ollama erwartet Zahlen (Sekunden, -1 = unbegrenzt) als int, sonst Dauer-Strings wie '30m'."""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+# Gesprächskontext
+CONTEXT_BUDGET_TOKENS = int(os.environ.get('OLLAMA_CHATBOT_CONTEXT_BUDGET', '4096'))  # Maximale Tokens pro Anfrage
+CONTEXT_MODE = os.environ.get('OLLAMA_CHATBOT_CONTEXT_MODE', 'window')  # 'window' oder 'summary'
+CONTEXT_LOW_WATER = float(os.environ.get('OLLAMA_CHATBOT_CONTEXT_LOW_WATER', '0.75'))  # Ziel nach dem Kürzen (Anteil am Budget)
+
+# Modell im Speicher halten, damit der KV-Cache zwischen den Runden erhalten bleibt
+KEEP_ALIVE = _duration(os.environ.get('OLLAMA_CHATBOT_KEEP_ALIVE', '30m'))
+
+# Ausgewähltes Modell vorab laden; das vorher gewählte optional entladen, um Speicher frei zu machen
+MODEL_PRELOAD = os.environ.get('OLLAMA_CHATBOT_PRELOAD', '1') == '1'
+MODEL_UNLOAD_PREVIOUS = os.environ.get('OLLAMA_CHATBOT_UNLOAD_PREVIOUS', '0') == '1'
+MODEL_STATE_POLL_MS = int(os.environ.get('OLLAMA_CHATBOT_MODEL_POLL_MS', '30000'))  # Abfrage der geladenen Modelle (/api/ps)
+
+# Verbindung zum Ollama-Server
+OLLAMA_HOST = os.environ.get('OLLAMA_HOST')  # None = Standard von ollama (http://127.0.0.1:11434)
+OLLAMA_TIMEOUT = float(os.environ.get('OLLAMA_CHATBOT_TIMEOUT', '300'))  # Sekunden für Lesen/Schreiben
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CHATBOT_CONNECT_TIMEOUT', '5'))
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get('OLLAMA_CHATBOT_MAX_CONNECTIONS', '8'))
+
+# Ablage für Caches und Einstellungen
+DATA_DIR = os.environ.get('OLLAMA_CHATBOT_HOME', os.path.join(os.path.expanduser('~'), '.ollama-chatbot'))
+
+# Protokoll (JSON-Zeilen, rotierend) und Metriken
+LOG_PATH = os.path.join(DATA_DIR, 'logs', 'chatbot.jsonl')
+LOG_LEVEL = os.environ.get('OLLAMA_CHATBOT_LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+METRICS_PORT = int(os.environ.get('OLLAMA_CHATBOT_METRICS_PORT', '0'))  # Prometheus-Endpunkt /metrics; 0 = aus
+
+# Modellliste (Metadaten werden für den nächsten Start zwischengespeichert)
+MODEL_CACHE_PATH = os.path.join(DATA_DIR, 'models.json')
+
+# Generierungsoptionen pro Modell (num_ctx, num_thread, num_batch, num_predict) und deren Abstimmung
+MODEL_OPTIONS_PATH = os.path.join(DATA_DIR, 'model_options.json')
+TUNE_BATCH_SIZES = [int(v) for v in os.environ.get('OLLAMA_CHATBOT_TUNE_BATCHES', '128,256,512').split(',') if v]
+TUNE_NUM_PREDICT = int(os.environ.get('OLLAMA_CHATBOT_TUNE_PREDICT', '64'))  # Tokens pro Messung
+TUNE_SAMPLES = max(1, int(os.environ.get('OLLAMA_CHATBOT_TUNE_SAMPLES', '3')))  # Messungen pro Kombination (Median)
+
+# Gespeicherte Gespräche
+CONVERSATION_DB_PATH = os.path.join(DATA_DIR, 'conversations.sqlite3')
+CONVERSATION_PAGE_SIZE = 50  # Nachrichten pro nachgeladener Seite
+
+# Dokumente als zusätzlicher Kontext (RAG)
+RAG_DIR = os.path.join(DATA_DIR, 'rag')
+RAG_EMBED_MODEL = os.environ.get('OLLAMA_CHATBOT_EMBED_MODEL', 'nomic-embed-text')
+RAG_CHUNK_CHARS = 1200  # Zeichen pro Abschnitt
+RAG_CHUNK_OVERLAP = 200  # Überlappung zwischen benachbarten Abschnitten
+RAG_EMBED_BATCH = 32  # Abschnitte pro Aufruf von /api/embed
+RAG_TOP_K = 4
+RAG_CONTEXT_TOKENS = int(os.environ.get('OLLAMA_CHATBOT_RAG_TOKENS', '1024'))  # Budget für eingefügte Abschnitte
+
+# Antwort-Cache: exakt (Modell, Optionen, Prompt, Kontext) und optional semantisch über Embeddings
+RESPONSE_CACHE = os.environ.get('OLLAMA_CHATBOT_RESPONSE_CACHE', '1') == '1'  # Standard für das Häkchen in der Oberfläche
+RESPONSE_CACHE_PATH = os.path.join(DATA_DIR, 'responses.sqlite3')
+RESPONSE_CACHE_TTL = float(os.environ.get('OLLAMA_CHATBOT_RESPONSE_CACHE_TTL', str(7 * 24 * 3600)))  # Sekunden
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('OLLAMA_CHATBOT_RESPONSE_CACHE_BYTES', str(64 * 1024 * 1024)))
+RESPONSE_CACHE_SEMANTIC = os.environ.get('OLLAMA_CHATBOT_SEMANTIC_CACHE', '0') == '1'  # Braucht RAG_EMBED_MODEL
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get('OLLAMA_CHATBOT_SEMANTIC_THRESHOLD', '0.95'))  # Kosinus-Ähnlichkeit
+
+# Nachbearbeitung der Antwort während des Streamings (postprocess.py)
+# Stoppsequenzen mit Komma getrennt; beim ersten Treffer wird die Generierung abgebrochen
+# Nur Marker aus Chat-Vorlagen, die in normalem Text nicht vorkommen (nicht '</s>': HTML-Durchstreichung);
+# die echten Endtokens des Modells beachtet ohnehin schon der Server
+STOP_SEQUENCES = [s for s in os.environ.get('OLLAMA_CHATBOT_STOP', '<|im_end|>,<|eot_id|>').split(',') if s]
+HIDE_THINKING = os.environ.get('OLLAMA_CHATBOT_HIDE_THINKING', '1') == '1'  # <think>…</think> nicht anzeigen
+
+# Übersetzung
+TRANSLATION_BACKEND = os.environ.get('OLLAMA_CHATBOT_TRANSLATOR', 'google')  # 'google' oder 'identity' (offline)
+TRANSLATION_CACHE_PATH = os.path.join(DATA_DIR, 'translations.sqlite3')
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.environ.get('OLLAMA_CHATBOT_TRANSLATION_CACHE_SIZE', '20000'))
+TRANSLATION_CHUNK_CHARS = 4500  # GoogleTranslator akzeptiert höchstens 5000 Zeichen pro Aufruf
+PIPELINED_TRANSLATION = os.environ.get('OLLAMA_CHATBOT_PIPELINED', '1') == '1'  # Antwort satzweise während der Generierung übersetzen
+TRANSLATION_WORKERS = int(os.environ.get('OLLAMA_CHATBOT_TRANSLATION_WORKERS', '3'))
+SEGMENT_MIN_CHARS = 40  # Kürzere Sätze werden zu einem Abschnitt zusammengefasst
+
+# Modellvergleich: höchstens so viele Modelle gleichzeitig (wie OLLAMA_MAX_LOADED_MODELS des Servers)
+FANOUT_MAX_PARALLEL = int(os.environ.get('OLLAMA_CHATBOT_FANOUT_PARALLEL', os.environ.get('OLLAMA_MAX_LOADED_MODELS', '3')))
+
+# Warteschlange für Generierungen
+SCHEDULER_WORKERS = int(os.environ.get('OLLAMA_CHATBOT_SCHEDULER_WORKERS', '4'))
+SCHEDULER_MAX_PER_MODEL = int(os.environ.get('OLLAMA_CHATBOT_MAX_PER_MODEL', os.environ.get('OLLAMA_NUM_PARALLEL', '1')))
+INPUT_DEBOUNCE_MS = 300  # Wiederholtes Strg+Enter innerhalb dieser Zeit wird ignoriert
+
+# HTTP-Server ohne Oberfläche (server.py)
+SERVER_HOST = os.environ.get('OLLAMA_CHATBOT_SERVER_HOST', '127.0.0.1')
+SERVER_PORT = int(os.environ.get('OLLAMA_CHATBOT_SERVER_PORT', '8765'))
+SERVER_MAX_SESSIONS = int(os.environ.get('OLLAMA_CHATBOT_SERVER_MAX_SESSIONS', '1000'))
+SERVER_SESSION_IDLE = float(os.environ.get('OLLAMA_CHATBOT_SERVER_SESSION_IDLE', '3600'))  # Sekunden bis eine Sitzung verfällt
+SERVER_MAX_BODY = 1024 * 1024  # Bytes pro Anfrage
@@ -0,0 +1,222 @@
+"""Dauerhafte Ablage der Gespräche in SQLite (WAL) mit Volltextsuche (FTS5).
+
+Schreibzugriffe landen in einer Warteschlange und werden von einem eigenen
+Thread gebündelt geschrieben, die Oberfläche wartet also nie auf die
+Festplatte. Nachrichten werden nur angehängt, nie geändert. Gelesen wird
+seitenweise, damit auch sehr lange Gespräche schnell geöffnet sind.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from config import CONVERSATION_DB_PATH, CONVERSATION_PAGE_SIZE
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS sessions ('
+    'id TEXT PRIMARY KEY, title TEXT NOT NULL, model TEXT, language TEXT, '
+    'created_at REAL NOT NULL, updated_at REAL NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS messages ('
+    'id INTEGER PRIMARY KEY, session_id TEXT NOT NULL REFERENCES sessions(id), '
+    'role TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)',
+    'CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)',
+)
+FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, content='messages', content_rowid='id')",
+    'CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN '
+    'INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content); END',
+)
+TITLE_LENGTH = 60
+
+def fts_query(text):
+    """Macht aus einer Benutzereingabe eine sichere FTS5-Abfrage (letztes Wort als Präfix)."""
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+class ConversationStore:
+    def __init__(self, path=CONVERSATION_DB_PATH):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._read_conn = sqlite3.connect(path, check_same_thread=False)
+        self._read_conn.execute('PRAGMA journal_mode=WAL')
+        for statement in SCHEMA:
+            self._read_conn.execute(statement)
+        try:
+            for statement in FTS_SCHEMA:
+                self._read_conn.execute(statement)
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            logging.warning(f"FTS5 nicht verfügbar, Suche ohne Index: {e}")
+            self.fts = False
+        self._read_conn.commit()
+        self._read_lock = threading.Lock()
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name='conversation-writer', daemon=True)
+        self._writer.start()
+
+    # Schreiben (asynchron)
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    for item in batch:
+                        if item is None:
+                            running = False
+                        else:
+                            conn.execute(*item)
+            except sqlite3.Error as e:
+                logging.error(f"Fehler beim Speichern des Gesprächs: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        conn.close()
+
+    def create_session(self, first_message, model=None, language=None):
+        """Legt ein Gespräch an und liefert sofort dessen ID."""
+        session_id = uuid.uuid4().hex
+        title = ' '.join(first_message.split())[:TITLE_LENGTH]
+        now = time.time()
+        self._queue.put(('INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?)', (session_id, title, model, language, now, now)))
+        return session_id
+
+    def append_message(self, session_id, role, content):
+        now = time.time()
+        self._queue.put(('INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)',
+                         (session_id, role, content, now)))
+        self._queue.put(('UPDATE sessions SET updated_at = ? WHERE id = ?', (now, session_id)))
+
+    def flush(self):
+        """Wartet, bis alle anstehenden Schreibvorgänge erledigt sind."""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+        with self._read_lock:
+            self._read_conn.close()
+
+    # Lesen
+
+    def _query(self, sql, params=()):
+        with self._read_lock:
+            return self._read_conn.execute(sql, params).fetchall()
+
+    def list_sessions(self, limit=100, offset=0):
+        rows = self._query(
+            'SELECT id, title, model, language, created_at, updated_at FROM sessions '
+            'ORDER BY updated_at DESC LIMIT ? OFFSET ?', (limit, offset)
+        )
+        return [dict(zip(('id', 'title', 'model', 'language', 'created_at', 'updated_at'), row)) for row in rows]
+
+    def get_session(self, session_id):
+        rows = self._query('SELECT id, title, model, language, created_at, updated_at FROM sessions WHERE id = ?', (session_id,))
+        return dict(zip(('id', 'title', 'model', 'language', 'created_at', 'updated_at'), rows[0])) if rows else None
+
+    def load_messages(self, session_id, before_id=None, limit=CONVERSATION_PAGE_SIZE):
+        """Eine Seite Nachrichten (älteste zuerst), die vor before_id liegen; ohne before_id die neuesten."""
+        rows = self._query(
+            'SELECT id, role, content, created_at FROM messages WHERE session_id = ? AND id < ? '
+            'ORDER BY id DESC LIMIT ?', (session_id, before_id if before_id is not None else 2**63 - 1, limit)
+        )
+        return [dict(zip(('id', 'role', 'content', 'created_at'), row)) for row in reversed(rows)]
+
+    def count_messages(self, session_id):
+        return self._query('SELECT COUNT(*) FROM messages WHERE session_id = ?', (session_id,))[0][0]
+
+    def iter_messages(self, session_id, page_size=500):
+        """Alle Nachrichten (älteste zuerst), seitenweise gelesen; für den Export sehr langer Gespräche."""
+        after_id = 0
+        while True:
+            rows = self._query(
+                'SELECT id, role, content, created_at FROM messages WHERE session_id = ? AND id > ? '
+                'ORDER BY id LIMIT ?', (session_id, after_id, page_size)
+            )
+            for row in rows:
+                yield dict(zip(('id', 'role', 'content', 'created_at'), row))
+            if len(rows) < page_size:
+                return
+            after_id = rows[-1][0]
+
+    def search(self, text, limit=50):
+        """Volltextsuche über alle Nachrichten; liefert Treffer mit Ausschnitt."""
+        if not text.strip():
+            return []
+        if self.fts:
+            try:
+                rows = self._query(
+                    "SELECT m.session_id, s.title, m.id, snippet(messages_fts, 0, '[', ']', '…', 12), m.created_at "
+                    'FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid JOIN sessions s ON s.id = m.session_id '
+                    'WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?', (fts_query(text), limit)
+                )
+            except sqlite3.OperationalError as e:
+                logging.warning(f"Ungültige Suchanfrage '{text}': {e}")
+                return []
+        else:
+            rows = self._query(
+                'SELECT m.session_id, s.title, m.id, substr(m.content, 1, 120), m.created_at '
+                'FROM messages m JOIN sessions s ON s.id = m.session_id '
+                'WHERE m.content LIKE ? ORDER BY m.id DESC LIMIT ?', (f'%{text}%', limit)
+            )
+        return [dict(zip(('session_id', 'title', 'message_id', 'snippet', 'created_at'), row)) for row in rows]
+
+    def restore_context(self, session_id, dialog_context):
+        """Füllt dialog_context mit den neuesten Nachrichten, die ins Token-Budget passen."""
+        from dialog_context import estimate_tokens
+        selected = []
+        tokens = 0
+        before_id = None
+        while tokens < dialog_context.max_tokens:
+            page = self.load_messages(session_id, before_id)
+            if not page:
+                break
+            for message in reversed(page):
+                tokens += estimate_tokens(message['content'])
+                if tokens > dialog_context.max_tokens:
+                    break
+                selected.append(message)
+            before_id = page[0]['id']
+        dialog_context.clear()
+        selected.reverse()
+        if selected and selected[0]['role'] == 'assistant':
+            selected = selected[1:]  # Kontext mit einer Benutzernachricht beginnen
+        for message in selected:
+            if message['role'] == 'user':
+                dialog_context.add_user(message['content'])
+            else:
+                dialog_context.add_assistant(message['content'])
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Liefert den gemeinsamen Gesprächsspeicher."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore()
+        return _store
+
+def close_store():
+    """Schließt den gemeinsamen Speicher, falls er überhaupt geöffnet wurde."""
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
@@ -0,0 +1,128 @@
+"""Gesprächskontext als Liste von Chat-Nachrichten mit Token-Budget."""
+import logging
+import threading
+from config import CONTEXT_BUDGET_TOKENS, CONTEXT_MODE, CONTEXT_LOW_WATER
+
+MESSAGE_OVERHEAD_TOKENS = 4  # Rollen- und Trennzeichen pro Nachricht
+SUMMARY_PREFIX = 'Zusammenfassung des bisherigen Gesprächs: '
+
+def estimate_tokens(text):
+    """Grobe Schätzung (ca. 4 Zeichen pro Token), ohne Tokenizer des Modells."""
+    return (len(text) + 3) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+def make_message(role, content, pinned=False):
+    return {'role': role, 'content': content, 'tokens': estimate_tokens(content), 'pinned': pinned}
+
+class DialogContext:
+    """Speichert den Dialog und hält jede Anfrage innerhalb des Token-Budgets.
+
+    Modi:
+    - 'window': die ältesten Gesprächsrunden werden verworfen.
+    - 'summary': die ältesten Gesprächsrunden werden vom Modell zusammengefasst.
+    Angeheftete Nachrichten (z.B. die Systemnachricht) werden nie entfernt.
+
+    Ollama verwendet den KV-Cache weiter, solange der Anfang der Nachrichtenliste
+    gleich bleibt. Deshalb wird beim Überschreiten des Budgets gleich bis auf
+    low_water * Budget gekürzt; die folgenden Runden hängen dann nur noch an.
+    """
+
+    def __init__(self, max_tokens=CONTEXT_BUDGET_TOKENS, mode=CONTEXT_MODE, low_water=CONTEXT_LOW_WATER):
+        if mode not in ('window', 'summary'):
+            raise ValueError(f"Unbekannter Kontextmodus: {mode}")
+        self.max_tokens = max_tokens
+        self.mode = mode
+        self.low_water = low_water
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __bool__(self):
+        return bool(self.messages)
+
+    @property
+    def total_tokens(self):
+        return sum(message['tokens'] for message in self.messages)
+
+    def set_system_prompt(self, content):
+        """Setzt die (angeheftete) Systemnachricht am Anfang des Kontexts."""
+        with self._lock:
+            if self.messages and self.messages[0]['role'] == 'system' and self.messages[0]['pinned']:
+                if self.messages[0]['content'] == content:
+                    return
+                self.messages[0] = make_message('system', content, pinned=True)
+            else:
+                self.messages.insert(0, make_message('system', content, pinned=True))
+
+    def add_user(self, content):
+        with self._lock:
+            self.messages.append(make_message('user', content))
+
+    def add_assistant(self, content):
+        with self._lock:
+            self.messages.append(make_message('assistant', content))
+
+    def clear(self):
+        with self._lock:
+            self.messages = []
+
+    def build_messages(self, user_input, summarizer=None):
+        """Liefert die Nachrichten für /api/chat inklusive der neuen Benutzereingabe.
+
+        Vorher wird das Budget durchgesetzt. Im Modus 'summary' wird dazu
+        summarizer(messages) -> str aufgerufen; fehlt er, wird wie bei
+        'window' gekürzt.
+        """
+        with self._lock:
+            self._enforce_budget(estimate_tokens(user_input), summarizer)
+            messages = [{'role': m['role'], 'content': m['content']} for m in self.messages]
+        messages.append({'role': 'user', 'content': user_input})
+        return messages
+
+    def _oldest_turn(self):
+        """Indizes der ältesten nicht angehefteten Gesprächsrunde (Benutzer + Antwort)."""
+        indices = [i for i, m in enumerate(self.messages) if not m['pinned']]
+        if not indices:
+            return []
+        turn = [indices[0]]
+        if len(indices) > 1 and self.messages[indices[0]]['role'] == 'user' and self.messages[indices[1]]['role'] == 'assistant':
+            turn.append(indices[1])
+        return turn
+
+    def _enforce_budget(self, reserved_tokens, summarizer):
+        budget = self.max_tokens - reserved_tokens
+        if self.total_tokens <= budget:
+            return
+        target = int(budget * self.low_water)
+        dropped = []
+        while self.total_tokens > target:
+            turn = self._oldest_turn()
+            if not turn:
+                break  # Nur noch angeheftete Nachrichten übrig
+            dropped.extend(self.messages[i] for i in turn)
+            for i in reversed(turn):
+                del self.messages[i]
+        if not dropped:
+            return
+        logging.info(f"{len(dropped)} Nachrichten aus dem Kontext entfernt.")
+        if self.mode == 'summary' and summarizer is not None:
+            self._insert_summary(dropped, summarizer, target)
+
+    def _insert_summary(self, dropped, summarizer, target):
+        # Eine vorhandene Zusammenfassung wird in die neue eingearbeitet
+        previous = [m for m in self.messages if m['pinned'] and m['content'].startswith(SUMMARY_PREFIX)]
+        try:
+            summary = summarizer(previous + dropped)
+        except Exception as e:
+            logging.error(f"Fehler bei der Zusammenfassung des Kontexts: {e}")
+            return
+        if not summary:
+            return
+        self.messages = [m for m in self.messages if m not in previous]
+        position = 1 if self.messages and self.messages[0]['role'] == 'system' and self.messages[0]['pinned'] else 0
+        self.messages.insert(position, make_message('system', SUMMARY_PREFIX + summary.strip(), pinned=True))
+        # Passt die Zusammenfassung nicht mehr ins Budget, wird weiter gekürzt
+        while self.total_tokens > target and self._oldest_turn():
+            for i in reversed(self._oldest_turn()):
+                del self.messages[i]
@@ -0,0 +1,148 @@
+"""Export gespeicherter Gespräche als Markdown, HTML, JSON (und PDF über die Oberfläche).
+
+Die Nachrichten werden seitenweise aus dem Speicher gelesen und direkt in die
+Datei geschrieben, auch sehr lange Gespräche liegen also nie ganz im
+Speicher. Gedacht für einen Hintergrund-Thread: Fortschritt über on_progress,
+Abbruch über cancel_event. Der PDF-Export braucht Qt und wird deshalb von der
+Oberfläche als writer übergeben.
+"""
+import html
+import json
+import os
+import re
+import time
+
+ROLE_LABELS = {'user': 'Benutzer', 'assistant': 'AI'}
+
+# Endung -> Bezeichnung im Dateidialog
+FORMATS = {
+    'pdf': 'PDF',
+    'md': 'Markdown',
+    'html': 'HTML',
+    'json': 'JSON',
+}
+PROGRESS_INTERVAL = 0.1  # Sekunden zwischen zwei Fortschrittsmeldungen
+
+class ExportCancelled(Exception):
+    pass
+
+def message_html(message):
+    label = html.escape(ROLE_LABELS.get(message['role'], message['role']))
+    content = html.escape(message['content']).replace('\n', '<br>')
+    return f'<p class="{message["role"]}"><b>{label}:</b> {content}</p>\n'
+
+def session_heading(session):
+    created = time.strftime('%d.%m.%Y %H:%M', time.localtime(session['created_at']))
+    return f"{session['title']} ({session['model'] or '?'}, {session['language'] or '?'}, {created})"
+
+def export_filename(session, fmt):
+    """Dateiname aus Datum und Titel, z.B. 2024-05-01_Was-ist-ein-Hund.md."""
+    date = time.strftime('%Y-%m-%d', time.localtime(session['created_at']))
+    slug = re.sub(r'[^\w]+', '-', session['title']).strip('-')[:40] or session['id'][:8]
+    return f"{date}_{slug}.{fmt}"
+
+def write_markdown(path, session, messages, step):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"# {session_heading(session)}\n\n")
+        for message in messages:
+            label = ROLE_LABELS.get(message['role'], message['role'])
+            f.write(f"**{label}:** {message['content']}\n\n")
+            step()
+
+def write_html(path, session, messages, step):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+                f'<title>{html.escape(session["title"])}</title>'
+                '<style>body{font-family:sans-serif;max-width:50em;margin:auto}'
+                '.user{color:#2e6b2e}.assistant{color:#333}</style></head><body>\n')
+        f.write(f'<h1>{html.escape(session_heading(session))}</h1>\n')
+        for message in messages:
+            f.write(message_html(message))
+            step()
+        f.write('</body></html>\n')
+
+def write_json(path, session, messages, step):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"session": ' + json.dumps(session, ensure_ascii=False) + ', "messages": [')
+        for number, message in enumerate(messages):
+            f.write((',\n' if number else '\n') + json.dumps(message, ensure_ascii=False))
+            step()
+        f.write('\n]}\n')
+
+WRITERS = {
+    'md': write_markdown,
+    'html': write_html,
+    'json': write_json,
+}
+
+def bulk_targets(store, session_ids, directory, fmt):
+    """[(session_id, Pfad), ...] für den Export mehrerer Gespräche in ein Verzeichnis."""
+    targets = []
+    used = set()
+    for session_id in session_ids:
+        session = store.get_session(session_id)
+        if session is None:
+            continue
+        name = export_filename(session, fmt)
+        while name in used:  # Gleicher Tag und Titel
+            name = f"{name.rsplit('.', 1)[0]}_{session_id[:6]}.{fmt}"
+        used.add(name)
+        targets.append((session_id, os.path.join(directory, name)))
+    return targets
+
+class _Progress:
+    def __init__(self, total, on_progress, cancel_event):
+        self.total = total
+        self.done = 0
+        self.on_progress = on_progress
+        self.cancel_event = cancel_event
+        self._last_report = 0.0
+
+    def step(self, title):
+        self.done += 1
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ExportCancelled()
+        now = time.monotonic()
+        if self.on_progress is not None and now - self._last_report >= PROGRESS_INTERVAL:
+            self._last_report = now
+            self.on_progress(self.done, self.total, title)
+
+    def finish(self):
+        if self.on_progress is not None:
+            self.on_progress(self.done, self.total, '')
+
+def export_sessions(store, targets, fmt, writers=None, on_progress=None, cancel_event=None):
+    """Exportiert [(session_id, Pfad), ...]; liefert die geschriebenen Pfade.
+
+    writer(path, session, messages, step) muss step() nach jeder Nachricht
+    aufrufen. on_progress(erledigte Nachrichten, alle Nachrichten, Titel) kommt
+    höchstens alle PROGRESS_INTERVAL Sekunden. Bei Abbruch (ExportCancelled)
+    bleibt keine halbe Datei liegen, geschrieben wird in eine temporäre Datei.
+    """
+    writer = (writers or WRITERS)[fmt]
+    store.flush()  # Auch die letzte Antwort soll dabei sein
+    sessions = [(store.get_session(session_id), path) for session_id, path in targets]
+    sessions = [(session, path) for session, path in sessions if session is not None]
+    progress = _Progress(sum(store.count_messages(session['id']) for session, _ in sessions), on_progress, cancel_event)
+    written = []
+    for session, path in sessions:
+        tmp_path = f"{path}.tmp"
+        try:
+            writer(tmp_path, session, store.iter_messages(session['id']),
+                   lambda title=session['title']: progress.step(title))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        written.append(path)
+    progress.finish()
+    return written
+
+def render_session(store, session_id, render, on_progress=None, cancel_event=None):
+    """Wie export_sessions für ein Gespräch, aber ohne Datei (z.B. zum Drucken): render(session, messages, step)."""
+    store.flush()
+    session = store.get_session(session_id)
+    progress = _Progress(store.count_messages(session_id), on_progress, cancel_event)
+    render(session, store.iter_messages(session_id), lambda: progress.step(session['title']))
+    progress.finish()
@@ -0,0 +1,96 @@
+"""Modellvergleich: dieselbe Anweisung parallel an mehrere Modelle senden.
+
+Höchstens FANOUT_MAX_PARALLEL Modelle laufen gleichzeitig, die übrigen warten
+in der Warteschlange. Bereits geladene Modelle kommen zuerst an die Reihe.
+Modelle, die erst geladen werden müssen, werden nacheinander geladen, damit
+sich die Ladevorgänge nicht gegenseitig ausbremsen oder Modelle verdrängen.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import FANOUT_MAX_PARALLEL, KEEP_ALIVE
+from dialog_context import DialogContext
+from model_options import get_model_options, limit_budget
+from model_registry import get_registry
+from ollama_client import get_client
+from pipeline import run_turn, PipelineError
+from translation import get_translator
+
+def resident_models():
+    """Namen der Modelle, die der Server gerade im Speicher hat."""
+    try:
+        return {model['model'] for model in get_client().ps()['models']}
+    except Exception as e:
+        logging.warning(f"Geladene Modelle konnten nicht abgefragt werden: {e}")
+        return set()
+
+def model_speed(stats):
+    """Kennzahlen einer Runde: Ladezeit, Zeit bis zum ersten Token, Gesamtdauer, Tokens/s."""
+    eval_count = stats.get('eval_count') or 0
+    eval_duration = stats.get('eval_duration') or 0
+    return {
+        'load': stats.get('load'),
+        'ttft': stats.get('first_token'),
+        'total': stats.get('total'),
+        'tokens_per_sec': eval_count / (eval_duration / 1e9) if eval_duration else None,
+    }
+
+def compare_models(anweisung, selected_language, target_language, models,
+                   on_started=None, on_chunk=None, on_finished=None, on_failed=None,
+                   cancel_event=None, max_workers=FANOUT_MAX_PARALLEL):
+    """Führt die Anweisung für jedes Modell aus; blockiert, bis alle fertig sind.
+
+    Rückrufe (aus Worker-Threads): on_started(model), on_chunk(model, text),
+    on_finished(model, text, speed), on_failed(model, message).
+    """
+    translator = get_translator()
+    # Einmal übersetzen; die Runden der einzelnen Modelle treffen dann den Cache
+    try:
+        anweisung = translator.translate(anweisung, target_language)
+    except Exception as e:
+        for model in models:
+            if on_failed is not None:
+                on_failed(model, f'Fehler bei der Übersetzung: {str(e)}')
+        return
+
+    resident = resident_models()
+    ordered = sorted(models, key=lambda model: model not in resident)
+    load_lock = threading.Lock()
+
+    def run_model(model):
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        if on_started is not None:
+            on_started(model)
+        stats = {}
+        options = get_model_options().get(model)
+        try:
+            if model not in resident:
+                with load_lock:
+                    load_started = time.perf_counter()
+                    # Nur laden; mit denselben Optionen, sonst lädt Ollama bei der ersten Anfrage neu
+                    get_client().generate(model=model, prompt='', options=options or None, keep_alive=KEEP_ALIVE)
+                    stats['load'] = time.perf_counter() - load_started
+            started = time.perf_counter()
+            result = run_turn(
+                anweisung, selected_language, target_language, model,
+                DialogContext(max_tokens=limit_budget(options, get_registry().context_budget(model))),
+                on_chunk=(lambda text: on_chunk(model, text)) if on_chunk is not None else None,
+                cancel_event=cancel_event, pipelined=False, translator=translator, stats=stats, options=options
+            )
+        except PipelineError as e:
+            if on_failed is not None:
+                on_failed(model, e.message)
+            return
+        except Exception as e:
+            logging.error(f"Fehler beim Modellvergleich mit {model}: {e}")
+            if on_failed is not None:
+                on_failed(model, str(e))
+            return
+        if result is not None and on_finished is not None:
+            stats['total'] = time.perf_counter() - started
+            on_finished(model, result[1], model_speed(stats))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ordered))), thread_name_prefix='fanout') as executor:
+        list(executor.map(run_model, ordered))
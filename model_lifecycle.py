@@ -0,0 +1,165 @@
+"""Laden, Entladen und Zustand der Modelle auf dem Ollama-Server.
+
+Wird ein anderes Modell ausgewählt, lädt preload() es im Hintergrund (leere
+Anfrage mit keep_alive), damit die erste Frage nicht die Ladezeit bezahlt.
+Ladeaufträge laufen über den Scheduler mit niedriger Priorität, immer nur
+einer zur Zeit; ein neuer ersetzt einen noch wartenden. Auf Wunsch wird das
+vorher gewählte Modell dabei entladen (keep_alive=0), um Speicher frei zu
+machen. Welche Modelle geladen sind, meldet /api/ps; dazwischen gilt ein
+Modell bis zum Ablauf von keep_alive nach der letzten Benutzung als warm.
+"""
+import logging
+import re
+import threading
+import time
+from config import KEEP_ALIVE
+from model_options import get_model_options
+from ollama_client import get_client
+from scheduler import get_scheduler, PRIORITY_BACKGROUND
+
+COLD = 'cold'
+LOADING = 'loading'
+WARM = 'warm'
+
+def keep_alive_seconds(value=KEEP_ALIVE):
+    """keep_alive in Sekunden; None = unbegrenzt. Versteht Zahlen und Dauern wie '30m' oder '1h30m'."""
+    if isinstance(value, (int, float)):
+        return None if value < 0 else float(value)
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    parts = re.findall(r'(-?\d+(?:\.\d+)?)(ms|s|m|h)', value)
+    if not parts:
+        return None
+    seconds = sum(float(number) * units[unit] for number, unit in parts)
+    return None if seconds < 0 else seconds
+
+class ModelLifecycle:
+    def __init__(self, scheduler=None):
+        self.scheduler = scheduler or get_scheduler()
+        self._states = {}  # Modell -> COLD, LOADING oder WARM
+        self._expires = {}  # Modell -> Zeitpunkt (time.time()), ab dem der Server es entlädt; None = nie
+        self._load_started = {}  # Modell -> time.monotonic() beim Start des Ladens
+        self._load_seconds = {}  # Modell -> Dauer des letzten Ladens (für die Fortschrittsanzeige)
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback):
+        """callback(model, state) bei jeder Änderung; kommt aus Hintergrund-Threads."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def state(self, model):
+        with self._lock:
+            state = self._states.get(model, COLD)
+            expires = self._expires.get(model)
+            if state == WARM and expires is not None and expires < time.time():
+                return COLD  # keep_alive abgelaufen; /api/ps bestätigt das beim nächsten Abfragen
+            return state
+
+    def load_progress(self, model):
+        """(Sekunden seit Ladebeginn, Dauer des letzten Ladens oder None) während LOADING, sonst None."""
+        with self._lock:
+            if self._states.get(model) != LOADING:
+                return None
+            return time.monotonic() - self._load_started[model], self._load_seconds.get(model)
+
+    def touch(self, model):
+        """Nach einer erfolgreichen Runde: das Modell ist geladen, keep_alive beginnt neu."""
+        seconds = keep_alive_seconds()
+        self._set_state(model, WARM, None if seconds is None else time.time() + seconds)
+
+    def invalidate(self, model):
+        """Nach geänderten Optionen: Ollama lädt das Modell bei der nächsten Anfrage neu."""
+        self._set_state(model, COLD)
+
+    def refresh_resident(self):
+        """Fragt /api/ps ab und gleicht die Zustände an; liefert {Modell: Ablaufzeit oder None}."""
+        try:
+            listed = get_client().ps()['models']
+        except Exception as e:
+            logging.warning(f"Geladene Modelle konnten nicht abgefragt werden: {e}")
+            return {}
+        resident = {entry['model']: entry['expires_at'].timestamp() if entry['expires_at'] else None
+                    for entry in listed}
+        with self._lock:
+            gone = [model for model, state in self._states.items() if state == WARM and model not in resident]
+        for model, expires in resident.items():
+            if self.state(model) != LOADING:
+                self._set_state(model, WARM, expires)
+        for model in gone:
+            self._set_state(model, COLD)
+        return resident
+
+    def preload(self, model, unload_previous=None):
+        """Lädt model im Hintergrund, vorher optional unload_previous entladen; liefert den Job."""
+        return self.scheduler.submit(
+            lambda cancel_event: self._load(model, unload_previous, cancel_event), model, PRIORITY_BACKGROUND,
+            group='preload', key=('preload', model, unload_previous), supersede=True
+        )
+
+    def unload(self, model):
+        """Entlädt model sofort, sofern der Scheduler keine Aufträge dafür hat."""
+        if self._has_jobs(model):
+            logging.info(f"{model} wird noch benutzt und bleibt geladen.")
+            return False
+        try:
+            get_client().generate(model=model, prompt='', keep_alive=0)
+        except Exception as e:
+            logging.warning(f"Fehler beim Entladen von {model}: {e}")
+            return False
+        self._set_state(model, COLD)
+        logging.info(f"{model} entladen.")
+        return True
+
+    def _load(self, model, unload_previous, cancel_event):
+        # Läuft in einem Thread des Schedulers
+        if unload_previous and unload_previous != model and self.state(unload_previous) != COLD:
+            self.unload(unload_previous)
+        if cancel_event.is_set() or self.state(model) == WARM:
+            return
+        with self._lock:
+            self._load_started[model] = time.monotonic()
+        self._set_state(model, LOADING)
+        try:
+            # Nur laden; mit den Optionen des Profils, sonst lädt Ollama bei der ersten Anfrage neu
+            options = get_model_options().get(model)
+            get_client().generate(model=model, prompt='', options=options or None, keep_alive=KEEP_ALIVE)
+        except Exception as e:
+            logging.error(f"Fehler beim Laden von {model}: {e}")
+            self._set_state(model, COLD)
+            return
+        with self._lock:
+            self._load_seconds[model] = time.monotonic() - self._load_started[model]
+        logging.info(f"{model} in {self._load_seconds[model]:.1f} s geladen.")
+        self.touch(model)
+
+    def _has_jobs(self, model):
+        queued, running = self.scheduler.snapshot()
+        return any(job.model == model and job.group != 'preload' for job in queued + running)
+
+    def _set_state(self, model, state, expires=None):
+        with self._lock:
+            changed = self._states.get(model, COLD) != state
+            self._states[model] = state
+            self._expires[model] = expires
+            listeners = list(self._listeners) if changed else []
+        for callback in listeners:
+            try:
+                callback(model, state)
+            except Exception as e:
+                logging.error(f"Fehler im Rückruf für den Modellzustand: {e}")
+
+_lifecycle = None
+_lifecycle_lock = threading.Lock()
+
+def get_lifecycle():
+    """Liefert die gemeinsame Modellverwaltung."""
+    global _lifecycle
+    with _lifecycle_lock:
+        if _lifecycle is None:
+            _lifecycle = ModelLifecycle()
+        return _lifecycle
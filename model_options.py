@@ -0,0 +1,196 @@
+"""Generierungsoptionen pro Modell (num_ctx, num_thread, num_batch, num_predict).
+
+Die Profile liegen als JSON im Datenverzeichnis und werden bei jeder Anfrage
+an das Modell mitgeschickt; fehlende Werte lässt Ollama auf seinem Standard.
+tune() misst auf diesem Rechner einige Kombinationen aus num_thread und
+num_batch und speichert die mit dem höchsten Durchsatz im Profil des Modells:
+
+    python model_options.py llama3.2 --threads 4,8 --batches 256,512
+    python model_options.py --show
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+from config import MODEL_OPTIONS_PATH, KEEP_ALIVE, TUNE_BATCH_SIZES, TUNE_NUM_PREDICT, TUNE_SAMPLES
+from ollama_client import get_client
+from telemetry import configure_logging
+
+# Option -> Beschreibung (Reihenfolge wie im Dialog)
+OPTION_KEYS = {
+    'num_ctx': 'Kontextlänge in Tokens',
+    'num_thread': 'CPU-Threads',
+    'num_batch': 'Tokens pro Schritt bei der Prompt-Auswertung',
+    'num_predict': 'Höchstens so viele Tokens erzeugen',
+}
+OUTPUT_OPTIONS = ('num_ctx', 'num_predict')  # Verändern die Antwort, gehören also in den Cache-Schlüssel
+TUNE_PROMPT = 'Erkläre in einigen Sätzen, wie ein Kühlschrank funktioniert.'
+TUNE_FIXED = {'seed': 42, 'temperature': 0}  # Gleiche Antwort bei jeder Messung
+TUNE_REFERENCE_PROMPT_TOKENS = 512  # Prompt einer typischen Runde (mit Verlauf) für die Bewertung
+
+def cache_options(options):
+    """Der Teil der Optionen, der die Antwort verändert (num_thread und num_batch nur die Geschwindigkeit)."""
+    return {key: options[key] for key in OUTPUT_OPTIONS if key in options}
+
+def limit_budget(options, budget):
+    """Kontext-Budget so kürzen, dass Anfrage und Antwort in num_ctx passen."""
+    if not options.get('num_ctx'):
+        return budget
+    return max(1, min(budget, options['num_ctx'] - max(options.get('num_predict') or 0, 0)))
+
+class ModelOptions:
+    def __init__(self, path=MODEL_OPTIONS_PATH):
+        self.path = path
+        self._profiles = None  # Modell -> {Option: Wert}; wird beim ersten Zugriff gelesen
+        self._lock = threading.Lock()
+
+    def get(self, model):
+        """Optionen für model (Kopie); {} ohne Profil."""
+        with self._lock:
+            return dict(self._load().get(model, {}))
+
+    def profiles(self):
+        with self._lock:
+            return {model: dict(options) for model, options in self._load().items()}
+
+    def set(self, model, options):
+        """Speichert das Profil; Werte None oder 0 entfallen (Standard des Servers)."""
+        options = {key: int(value) for key, value in options.items() if key in OPTION_KEYS and value}
+        with self._lock:
+            profiles = self._load()
+            if options:
+                profiles[model] = options
+            else:
+                profiles.pop(model, None)
+            self._save(profiles)
+
+    def _load(self):
+        if self._profiles is None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._profiles = json.load(f)
+            except FileNotFoundError:
+                self._profiles = {}
+            except (OSError, ValueError) as e:
+                logging.warning(f"Modell-Optionen konnten nicht gelesen werden: {e}")
+                self._profiles = {}
+        return self._profiles
+
+    def _save(self, profiles):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(profiles, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Modell-Optionen konnten nicht geschrieben werden: {e}")
+
+_model_options = None
+_model_options_lock = threading.Lock()
+
+def get_model_options():
+    """Liefert die gemeinsamen Modell-Optionen."""
+    global _model_options
+    with _model_options_lock:
+        if _model_options is None:
+            _model_options = ModelOptions()
+        return _model_options
+
+def default_thread_counts():
+    cores = os.cpu_count() or 1
+    return sorted({max(1, cores // 4), max(1, cores // 2), cores})
+
+def tune(model, thread_counts=None, batch_sizes=TUNE_BATCH_SIZES, num_predict=TUNE_NUM_PREDICT, on_result=None,
+         cancel_event=None, store=None, base=None, samples=TUNE_SAMPLES):
+    """Misst alle Kombinationen und speichert die schnellste; liefert (beste Optionen, alle Ergebnisse).
+
+    Jede Kombination wird samples-mal gemessen (seed und temperature fest);
+    zählt der Median der Raten laut Server, also Tokens pro Sekunde bei der
+    Generierung und bei der Prompt-Auswertung. Die Gesamtzeit taugt nicht,
+    weil eine Antwort, die vor num_predict endet, einfach weniger Tokens hat.
+    Bewertet wird die daraus geschätzte Dauer einer typischen Runde
+    (TUNE_REFERENCE_PROMPT_TOKENS Prompt, num_predict Antwort). Die Ladezeit
+    zählt nicht, denn Ollama lädt das Modell bei geänderten num_thread/num_batch
+    neu. on_result(Ergebnis) kommt nach jeder Kombination.
+    base sind die übrigen Optionen (Standard: das gespeicherte Profil).
+    """
+    store = store or get_model_options()
+    base = dict(base) if base is not None else store.get(model)
+    client = get_client()
+    results = []
+    for num_thread in thread_counts or default_thread_counts():
+        for num_batch in batch_sizes:
+            options = {**base, **TUNE_FIXED, 'num_thread': num_thread, 'num_batch': num_batch,
+                       'num_predict': num_predict}
+            eval_rates, prompt_rates = [], []
+            for sample in range(samples):
+                if cancel_event is not None and cancel_event.is_set():
+                    return None, results
+                # Anderer Anfang je Messung, sonst nimmt Ollama den Prompt aus dem KV-Cache
+                prompt = f"({sample + 1}) {TUNE_PROMPT}"
+                response = client.generate(model=model, prompt=prompt, options=options, keep_alive=KEEP_ALIVE)
+                eval_rates.append(_rate(response['eval_count'], response['eval_duration']))
+                prompt_rates.append(_rate(response['prompt_eval_count'], response['prompt_eval_duration']))
+            tokens_per_sec = _median(eval_rates)
+            prompt_tokens_per_sec = _median(prompt_rates)
+            result = {
+                'num_thread': num_thread,
+                'num_batch': num_batch,
+                'tokens_per_sec': tokens_per_sec,
+                'prompt_tokens_per_sec': prompt_tokens_per_sec,
+                'seconds': (TUNE_REFERENCE_PROMPT_TOKENS / prompt_tokens_per_sec + num_predict / tokens_per_sec
+                            if tokens_per_sec and prompt_tokens_per_sec else float('inf')),
+            }
+            results.append(result)
+            logging.info(f"Abstimmung {model}: {result}")
+            if on_result is not None:
+                on_result(result)
+    if not results:
+        return None, results
+    best = min(results, key=lambda result: result['seconds'])
+    best_options = {**base, 'num_thread': best['num_thread'], 'num_batch': best['num_batch']}
+    store.set(model, best_options)
+    return best_options, results
+
+def _rate(count, duration):
+    """Tokens pro Sekunde aus Zähler und Dauer (ns); None ohne Messwert."""
+    return count / (duration / 1e9) if count and duration else None
+
+def _median(rates):
+    rates = [rate for rate in rates if rate]
+    return statistics.median(rates) if rates else None
+
+def format_result(result):
+    """Eine Messung als Text für CLI und Dialog."""
+    rate = lambda value: f"{value:.1f}" if value else '–'
+    return (f"num_thread={result['num_thread']}, num_batch={result['num_batch']}: "
+            f"{rate(result['tokens_per_sec'])} Tokens/s, Prompt {rate(result['prompt_tokens_per_sec'])} Tokens/s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generierungsoptionen pro Modell anzeigen oder automatisch abstimmen.')
+    parser.add_argument('model', nargs='?', help='Modell, für das num_thread und num_batch abgestimmt werden')
+    parser.add_argument('--threads', help='Kommagetrennte Werte für num_thread (Standard: abhängig von den CPU-Kernen)')
+    parser.add_argument('--batches', help='Kommagetrennte Werte für num_batch')
+    parser.add_argument('--show', action='store_true', help='Gespeicherte Profile ausgeben')
+    args = parser.parse_args(argv)
+    configure_logging()
+    if args.show or not args.model:
+        print(json.dumps(get_model_options().profiles(), indent=2, ensure_ascii=False))
+        return 0
+
+    parse = lambda value: [int(v) for v in value.split(',') if v] if value else None
+    report = lambda result: print(format_result(result), file=sys.stderr, flush=True)
+    try:
+        best, _ = tune(args.model, parse(args.threads), parse(args.batches) or TUNE_BATCH_SIZES, on_result=report)
+    except KeyboardInterrupt:
+        print("\nAbgebrochen; das Profil bleibt unverändert.", file=sys.stderr)
+        return 1
+    print(f"Gespeichert für {args.model}: {json.dumps(best)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""Verzeichnis der installierten Modelle mit Metadaten aus der Ollama-API.
+
+Die Metadaten werden auf der Festplatte zwischengespeichert, damit die
+Modellliste beim nächsten Start sofort verfügbar ist. refresh() fragt
+/api/tags ab und ruft /api/show nur für neue oder geänderte Modelle auf.
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import MODEL_CACHE_PATH, CONTEXT_BUDGET_TOKENS
+from ollama_client import get_client
+
+SHOW_WORKERS = 4
+
+class ModelRegistry:
+    def __init__(self, cache_path=MODEL_CACHE_PATH):
+        self.cache_path = cache_path
+        self._models = {}  # Name -> Metadaten
+        self._lock = threading.Lock()
+
+    def load_cached(self):
+        """Lädt die Metadaten vom letzten Start (ohne Serverzugriff)."""
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                models = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logging.warning(f"Modell-Cache konnte nicht gelesen werden: {e}")
+            return []
+        with self._lock:
+            self._models = {model['name']: model for model in models}
+        return self.names()
+
+    def refresh(self):
+        """Fragt den Server ab, aktualisiert den Cache und liefert die Modellnamen."""
+        client = get_client()
+        listed = client.list()['models']
+        with self._lock:
+            known = dict(self._models)
+        models = {}
+        changed = []
+        for entry in listed:
+            name = entry['model']
+            details = entry['details']
+            previous = known.get(name)
+            models[name] = {
+                'name': name,
+                'digest': entry['digest'],
+                'size': int(entry['size'] or 0),
+                'family': details['family'] if details else None,
+                'parameter_size': details['parameter_size'] if details else None,
+                'quantization': details['quantization_level'] if details else None,
+                'context_length': previous.get('context_length') if previous and previous['digest'] == entry['digest'] else None,
+            }
+            if models[name]['context_length'] is None:
+                changed.append(name)
+
+        # /api/show nur für neue oder geänderte Modelle
+        if changed:
+            with ThreadPoolExecutor(max_workers=SHOW_WORKERS) as executor:
+                for name, context_length in zip(changed, executor.map(self._fetch_context_length, changed)):
+                    models[name]['context_length'] = context_length
+
+        with self._lock:
+            self._models = models
+        self._save(list(models.values()))
+        logging.info(f"{len(models)} Modelle gefunden, {len(changed)} Metadaten neu abgefragt.")
+        return self.names()
+
+    def _fetch_context_length(self, name):
+        try:
+            info = get_client().show(name)['modelinfo'] or {}
+        except Exception as e:
+            logging.error(f"Fehler beim Abfragen von {name}: {e}")
+            return None
+        for key, value in info.items():
+            if key.endswith('.context_length'):
+                return int(value)
+        return None
+
+    def _save(self, models):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(models, f, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logging.warning(f"Modell-Cache konnte nicht geschrieben werden: {e}")
+
+    def names(self):
+        with self._lock:
+            return list(self._models)
+
+    def get(self, name):
+        with self._lock:
+            return self._models.get(name)
+
+    def context_budget(self, name, default=CONTEXT_BUDGET_TOKENS):
+        """Token-Budget für den Kontext: höchstens die Kontextlänge des Modells."""
+        model = self.get(name)
+        if model and model.get('context_length'):
+            return min(default, model['context_length'])
+        return default
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """Liefert das gemeinsame Modellverzeichnis."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
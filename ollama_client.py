@@ -0,0 +1,54 @@
+"""Gemeinsamer, langlebiger Ollama-Client mit Verbindungspool.
+
+Der Client wird beim ersten Zugriff einmal erzeugt und danach von allen
+Aufrufen (Modellliste, Generierung, ...) wiederverwendet. ollama und httpx
+werden erst dann importiert, damit sie den Programmstart nicht verzögern.
+"""
+import logging
+import threading
+from config import OLLAMA_HOST, OLLAMA_TIMEOUT, OLLAMA_CONNECT_TIMEOUT, OLLAMA_MAX_CONNECTIONS
+
+_client = None
+_client_lock = threading.Lock()
+_host = OLLAMA_HOST
+
+def get_client():
+    """Liefert den gemeinsamen ollama.Client (threadsicher)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            import httpx
+            import ollama
+            _client = ollama.Client(
+                host=_host,
+                timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=OLLAMA_MAX_CONNECTIONS
+                )
+            )
+            logging.info(f"Ollama-Client erstellt (Host: {_host or 'Standard'}).")
+        return _client
+
+def is_server_available():
+    """Prüft, ob der Ollama-Server erreichbar ist."""
+    try:
+        get_client().ps()
+        return True
+    except Exception as e:
+        logging.error(f"Ollama-Server nicht erreichbar: {e}")
+        return False
+
+def close_client():
+    """Schließt den Verbindungspool (beim Beenden der Anwendung)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client._client.close()
+            _client = None
+
+def set_host(host):
+    """Verwendet ab dem nächsten get_client() einen anderen Server (z.B. für Benchmarks)."""
+    global _host
+    close_client()
+    _host = host
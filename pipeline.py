@@ -0,0 +1,250 @@
+"""Ablauf einer Gesprächsrunde: Anweisung übersetzen, Antwort generieren, Antwort übersetzen.
+
+Im Pipeline-Modus wird die Antwort satzweise übersetzt, während das Modell
+noch generiert. Die Gesamtdauer ist dann nicht mehr die Summe der Schritte.
+"""
+import logging
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from config import TRANSLATION_WORKERS, SEGMENT_MIN_CHARS
+from model_options import cache_options
+from postprocess import make_chain, clean_text
+from translation import detect_language, get_translator
+from telemetry import trace_turn
+from utils import stream_ollama_chat, summarize_messages
+
+SENTENCE_END = re.compile(r'[.!?…:;]["\'»”)\]]*\s+|\n+')
+SENTENCE_LOOKBACK = 8  # Satzzeichen am Ende des alten Puffers erneut prüfen
+DETECTION_LIMIT_CHARS = 2000  # Spracherkennung nur am Anfang der Antwort
+
+class PipelineError(Exception):
+    """Fehler in einem Schritt der Pipeline, mit Titel für die Fehlermeldung."""
+
+    def __init__(self, title, message):
+        super().__init__(message)
+        self.title = title
+        self.message = message
+
+class SentenceBuffer:
+    """Sammelt Token und gibt vollständige Sätze zurück; ''.join(Ausgaben) == Eingabe."""
+
+    def __init__(self, min_chars=SEGMENT_MIN_CHARS):
+        self.min_chars = min_chars
+        self._text = ''
+
+    def feed(self, text):
+        scan_from = max(0, len(self._text) - SENTENCE_LOOKBACK)
+        self._text += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._text, scan_from):
+            if match.end() == len(self._text):
+                break  # Leerraum am Ende könnte im nächsten Token weitergehen
+            if match.end() - start >= self.min_chars:
+                sentences.append(self._text[start:match.end()])
+                start = match.end()
+        self._text = self._text[start:]
+        return sentences
+
+    def flush(self):
+        text, self._text = self._text, ''
+        return text
+
+class IncrementalTranslator:
+    """Übersetzt Sätze parallel und liefert sie in der richtigen Reihenfolge an on_segment."""
+
+    def __init__(self, translator, target, on_segment=None, max_workers=TRANSLATION_WORKERS):
+        self.translator = translator
+        self.target = target
+        self.on_segment = on_segment
+        self._buffer = SentenceBuffer()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='translate')
+        self._pending = deque()
+        self._results = []
+        self._lock = threading.Lock()
+        self._error = None
+        self._seen = ''
+        self._passthrough = None  # True: Antwort ist bereits in der Zielsprache
+
+    def feed(self, text):
+        for sentence in self._buffer.feed(text):
+            self._submit(sentence)
+
+    def _submit(self, sentence):
+        if self._passthrough is None and len(self._seen) < DETECTION_LIMIT_CHARS:
+            self._seen += sentence
+            detected = detect_language(self._seen)
+            if detected is not None:
+                self._passthrough = detected == self.target
+        if self._passthrough:
+            future = Future()
+            future.set_result(sentence)
+        else:
+            future = self._executor.submit(self.translator.translate, sentence, self.target)
+        with self._lock:
+            self._pending.append(future)
+        future.add_done_callback(lambda _: self._drain())
+
+    def _drain(self):
+        # Fertige Übersetzungen nur von vorne abholen, damit die Reihenfolge stimmt
+        with self._lock:
+            while self._pending and self._pending[0].done() and self._error is None:
+                future = self._pending.popleft()
+                if future.exception() is not None:
+                    self._error = future.exception()
+                    break
+                text = future.result()
+                self._results.append(text)
+                if self.on_segment is not None:
+                    self.on_segment(text)
+
+    def finish(self):
+        """Übersetzt den Rest, wartet auf alle Sätze und liefert den gesamten Text."""
+        rest = self._buffer.flush()
+        if rest.strip():
+            self._submit(rest)
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+        self._drain()
+        self._executor.shutdown(wait=False)
+        if self._error is not None:
+            raise self._error
+        return ''.join(self._results)
+
+    def cancel(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+def run_turn(anweisung, selected_language, target_language, selected_model, dialog_context,
+             on_anweisung=None, on_chunk=None, on_segment=None, cancel_event=None, pipelined=True, translator=None,
+             stats=None, retriever=None, response_cache=None, options=None):
+    """Führt eine Gesprächsrunde aus.
+
+    Rückgabe: (übersetzte Anweisung, Antwort) oder None bei Abbruch.
+    on_chunk erhält die Token des Modells, on_segment die fertig übersetzten
+    Abschnitte (nur im Pipeline-Modus). Fehler werden als PipelineError gemeldet.
+    In stats (dict) landen die Dauern der Schritte in Sekunden
+    (translate_in, first_token, first_segment, generation, translate_out, total)
+    und die Zähler des Servers (siehe utils.STAT_FIELDS); daraus wird am Ende
+    der Span der Runde (telemetry.build_span).
+    retriever(anweisung) -> str liefert optional Auszüge aus eigenen Dokumenten,
+    die der Benutzernachricht vorangestellt werden (nicht im Dialogkontext gespeichert).
+    Mit response_cache (siehe response_cache.ResponseCache) werden wiederholte
+    Anweisungen ohne Generierung beantwortet; stats['cache'] nennt dann die Stufe.
+    options (num_ctx, num_thread, ...) gehen an jede Anfrage an das Modell.
+    """
+    translator = translator or get_translator()
+    cancelled = lambda: cancel_event is not None and cancel_event.is_set()
+    stats = stats if stats is not None else {}
+    with trace_turn(selected_model, stats, cancel_event):  # Span fürs Protokoll und die Metriken
+        started = time.perf_counter()
+
+        # Übersetze Benutzeranweisung in die gewünschte Sprache
+        try:
+            anweisung = translator.translate(anweisung, target_language)
+        except Exception as e:
+            raise PipelineError('Übersetzungsfehler', f'Fehler bei der Übersetzung: {str(e)}')
+        stats['translate_in'] = time.perf_counter() - started
+        if cancelled():
+            return None
+        if on_anweisung is not None:
+            on_anweisung(anweisung)
+
+        # Passende Abschnitte aus eigenen Dokumenten
+        user_message = anweisung
+        if retriever is not None:
+            retrieval_started = time.perf_counter()
+            retrieved = retriever(anweisung)
+            stats['retrieval'] = time.perf_counter() - retrieval_started
+            if retrieved:
+                user_message = f"{retrieved}\n\n{anweisung}"
+
+        # Kontext erstellen (innerhalb des Token-Budgets)
+        dialog_context.set_system_prompt(f"Bitte antworte in {selected_language}.")
+        messages = dialog_context.build_messages(user_message, summarizer=lambda m: summarize_messages(m, selected_model, options))
+
+        def segment_received(segment):
+            stats.setdefault('first_segment', time.perf_counter() - started)
+            if on_segment is not None:
+                on_segment(segment)
+
+        incremental = IncrementalTranslator(translator, target_language, segment_received) if pipelined else None
+        output_options = cache_options(options or {})  # Für den Cache-Schlüssel
+        cached = response_cache.lookup(selected_model, messages, output_options) if response_cache is not None else None
+        if cached is not None:
+            stats['cache'] = cached[1]
+            chunks = [cached[0]]  # Wie eine sofort fertige Generierung weiterverarbeiten
+        else:
+            stats.pop('done', None)  # Setzt erst der letzte Chunk dieser Antwort
+            chunks = stream_ollama_chat(messages, selected_model, cancel_event, stats, options)
+        parts = []
+
+        def emit(text):
+            parts.append(text)
+            if on_chunk is not None:
+                on_chunk(text)
+            if incremental is not None:
+                incremental.feed(text)
+
+        # Nachbearbeitung schon während des Streamings (Denkblöcke, Stoppsequenzen, Ränder)
+        chain = make_chain()
+        generation_started = time.perf_counter()
+        try:
+            for chunk in chunks:
+                stats.setdefault('first_token', time.perf_counter() - started)
+                text = chain.feed(chunk)
+                if text:
+                    emit(text)
+                if chain.stopped:
+                    stats['stopped'] = True
+                    if cached is None:
+                        chunks.close()  # Bricht die Anfrage ab, statt den Rest noch erzeugen zu lassen
+                    logging.info("Stoppsequenz erkannt, Generierung vorzeitig beendet.")
+                    break
+        except Exception as e:
+            if incremental is not None:
+                incremental.cancel()
+            if cancelled():
+                return None
+            raise PipelineError('Fehler', f'Fehler bei der Generierung des Textes: {str(e)}')
+
+        stats['generation'] = time.perf_counter() - generation_started
+        if cancelled():
+            if incremental is not None:
+                incremental.cancel()
+            return None
+        if cached is None and not stats.get('stopped') and not stats.get('done'):
+            # Ohne den letzten Chunk ist die Antwort abgeschnitten; nicht cachen und nicht in den Kontext
+            if incremental is not None:
+                incremental.cancel()
+            raise PipelineError('Fehler', 'Die Antwort des Modells ist unvollständig (Verbindung abgebrochen).')
+        text = chain.flush()
+        if text:
+            emit(text)
+
+        generated_text = ''.join(parts)
+        if not generated_text:
+            if incremental is not None:
+                incremental.cancel()
+            raise PipelineError('Fehler', 'Fehler bei der Generierung des Textes!')
+        if response_cache is not None and cached is None:
+            response_cache.put(selected_model, messages, generated_text, output_options)
+
+        # Übersetze die Antwort zurück in die gewünschte Sprache (falls nötig)
+        translate_started = time.perf_counter()
+        try:
+            if incremental is not None:
+                generated_text = clean_text(incremental.finish())
+            else:
+                generated_text = translator.translate(generated_text, target_language)
+        except Exception as e:
+            logging.error(f"Fehler bei der Übersetzung der Antwort: {e}")
+            raise PipelineError('Übersetzungsfehler', f'Fehler bei der Übersetzung: {str(e)}')
+        stats['translate_out'] = time.perf_counter() - translate_started
+        stats.setdefault('first_segment', time.perf_counter() - started)
+        if cancelled():
+            return None
+        return anweisung, generated_text
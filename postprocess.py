@@ -0,0 +1,173 @@
+"""Nachbearbeitung der Modellantwort während des Streamings.
+
+Jeder Filter bekommt die Token in beliebig geschnittenen Stücken (feed) und
+gibt nur Text weiter, der sich durch spätere Stücke nicht mehr ändern kann;
+mögliche Anfänge eines Markers hält er zurück, bis das nächste Stück Klarheit
+bringt. flush() gibt am Ende den Rest aus. Jeder Filter hält höchstens so
+viel zurück, wie sein längster Marker lang ist (bzw. den Leerraum am Ende),
+die Laufzeit ist also linear in der Länge der Antwort.
+
+    chain = make_chain()
+    for chunk in stream:
+        text = chain.feed(chunk)
+        if chain.stopped:
+            break  # Stoppsequenz: Generierung abbrechen
+    text += chain.flush()
+"""
+from config import STOP_SEQUENCES, HIDE_THINKING
+
+THINK_TAGS = ('<think>', '</think>')
+
+def _partial_suffix(text, marker):
+    """Länge des längsten Endes von text, das ein echter Anfang von marker ist."""
+    start = text.find(marker[0], max(0, len(text) - len(marker) + 1))
+    while start >= 0:
+        if marker.startswith(text[start:]):
+            return len(text) - start
+        start = text.find(marker[0], start + 1)
+    return 0
+
+class ThinkFilter:
+    """Entfernt Denkblöcke wie <think>…</think> von Reasoning-Modellen."""
+
+    def __init__(self, open_tag=THINK_TAGS[0], close_tag=THINK_TAGS[1]):
+        self.open_tag = open_tag
+        self.close_tag = close_tag
+        self.inside = False
+        self.stopped = False
+        self._held = ''
+
+    def feed(self, text):
+        text = self._held + text
+        self._held = ''
+        output = []
+        position = 0
+        while True:
+            tag = self.close_tag if self.inside else self.open_tag
+            found = text.find(tag, position)
+            if found < 0:
+                break
+            if not self.inside:
+                output.append(text[position:found])
+            self.inside = not self.inside
+            position = found + len(tag)
+        rest = text[position:]
+        held = _partial_suffix(rest, self.close_tag if self.inside else self.open_tag)
+        if held:
+            rest, self._held = rest[:-held], rest[-held:]
+        if not self.inside:
+            output.append(rest)
+        return ''.join(output)
+
+    def flush(self):
+        # Ein unvollständiger Tag am Ende war doch Text; ein offener Denkblock bleibt verborgen
+        held, self._held = self._held, ''
+        return '' if self.inside else held
+
+class StopFilter:
+    """Schneidet die Antwort an der ersten Stoppsequenz ab; stopped meldet, dass der Rest unnötig ist."""
+
+    def __init__(self, stop_sequences=STOP_SEQUENCES):
+        self.stop_sequences = [sequence for sequence in stop_sequences if sequence]
+        self.stopped = False
+        self.matched = None
+        self._held = ''
+
+    def feed(self, text):
+        if self.stopped:
+            return ''
+        text = self._held + text
+        self._held = ''
+        cut = None
+        for sequence in self.stop_sequences:
+            found = text.find(sequence)
+            if found >= 0 and (cut is None or found < cut):
+                cut, self.matched = found, sequence
+        if cut is not None:
+            self.stopped = True
+            return text[:cut]
+        held = max((_partial_suffix(text, sequence) for sequence in self.stop_sequences), default=0)
+        if held:
+            text, self._held = text[:-held], text[-held:]
+        return text
+
+    def flush(self):
+        held, self._held = self._held, ''
+        return held
+
+class EdgeFilter:
+    """Entfernt Leerraum und Anführungszeichen am Anfang und Ende sowie eine letzte Zeile nur mit '.'.
+
+    Das Ende steht erst bei flush() fest; bis dahin werden Leerraum,
+    Anführungszeichen und '\\n.' am Ende zurückgehalten und erst ausgegeben,
+    wenn danach noch Text kommt.
+    """
+    EDGE_CHARS = ' \t\r\n"'
+
+    def __init__(self):
+        self.started = False
+        self.stopped = False
+        self._held = ''
+
+    def feed(self, text):
+        if not self.started:
+            text = text.lstrip(self.EDGE_CHARS)
+            if not text:
+                return ''
+            self.started = True
+        # Nur das neue Stück rückwärts absuchen; was davor zurückgehalten wurde, ist schon Randzeichen
+        end = len(text)
+        while end > 0:
+            char = text[end - 1]
+            if char in self.EDGE_CHARS:
+                end -= 1
+            elif char == '.' and (text[end - 2] if end >= 2 else self._held[-1:]) == '\n':
+                end -= 2 if end >= 2 else 1  # '\n.' ganz am Ende (bei manchen Modellen üblich)
+            else:
+                break
+        if end == 0:
+            self._held += text
+            return ''
+        output = self._held + text[:end]
+        self._held = text[end:]
+        return output
+
+    def flush(self):
+        self._held = ''
+        return ''
+
+class FilterChain:
+    """Hintereinandergeschaltete Filter; die Ausgabe eines Filters ist die Eingabe des nächsten."""
+
+    def __init__(self, filters):
+        self.filters = list(filters)
+
+    @property
+    def stopped(self):
+        return any(stream_filter.stopped for stream_filter in self.filters)
+
+    def feed(self, text):
+        for stream_filter in self.filters:
+            if not text:
+                return ''
+            text = stream_filter.feed(text)
+        return text
+
+    def flush(self):
+        text = ''
+        for stream_filter in self.filters:
+            text = stream_filter.feed(text) + stream_filter.flush() if text else stream_filter.flush()
+        return text
+
+def make_chain(stop_sequences=STOP_SEQUENCES, hide_thinking=HIDE_THINKING):
+    """Neue Filterkette für eine Antwort: Denkblöcke, Stoppsequenzen, Ränder."""
+    filters = [ThinkFilter()] if hide_thinking else []
+    if stop_sequences:
+        filters.append(StopFilter(stop_sequences))
+    filters.append(EdgeFilter())
+    return FilterChain(filters)
+
+def clean_text(text, **settings):
+    """Wendet die Filterkette auf einen fertigen Text an."""
+    chain = make_chain(**settings)
+    return chain.feed(text) + chain.flush()
@@ -0,0 +1,254 @@
+"""Eigene Dokumente als zusätzlicher Kontext (Retrieval-augmented generation).
+
+Dateien (txt/md/pdf) werden in Abschnitte zerlegt und über /api/embed in
+Vektoren umgewandelt. Die Vektoren liegen normiert in einer per mmap
+geöffneten NumPy-Matrix, die Suche ist ein einziges Matrix-Vektor-Produkt.
+Beim erneuten Indexieren werden nur Dateien mit geändertem Inhalt (SHA-256)
+neu eingebettet; Lesen und Zerlegen laufen in einem Prozess-Pool.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config import (RAG_DIR, RAG_EMBED_MODEL, RAG_CHUNK_CHARS, RAG_CHUNK_OVERLAP, RAG_EMBED_BATCH,
+                    RAG_TOP_K, RAG_CONTEXT_TOKENS)
+from dialog_context import estimate_tokens
+from ollama_client import get_client
+
+SUPPORTED_EXTENSIONS = ('.txt', '.md', '.pdf')
+INITIAL_CAPACITY = 1024
+
+def read_document(path):
+    """Liest den Text einer Datei; PDF nur, wenn pypdf installiert ist."""
+    if path.lower().endswith('.pdf'):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            logging.warning(f"pypdf ist nicht installiert, PDF wird übersprungen: {path}")
+            return ''
+        return '\n\n'.join(page.extract_text() or '' for page in PdfReader(path).pages)
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+def chunk_text(text, size=RAG_CHUNK_CHARS, overlap=RAG_CHUNK_OVERLAP):
+    """Zerlegt text in überlappende Abschnitte, möglichst an Absatz- oder Satzgrenzen."""
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            # Zurück zur letzten Absatz- oder Satzgrenze in der zweiten Hälfte
+            boundary = max(text.rfind('\n\n', start + size // 2, end), text.rfind('. ', start + size // 2, end))
+            if boundary > start:
+                end = boundary + 1
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+def hash_and_chunk(path, known_hash=None):
+    """Läuft im Prozess-Pool: Hash berechnen und nur bei Änderungen zerlegen."""
+    with open(path, 'rb') as f:
+        content_hash = hashlib.sha256(f.read()).hexdigest()
+    if content_hash == known_hash:
+        return path, content_hash, None
+    try:
+        return path, content_hash, chunk_text(read_document(path))
+    except Exception as e:
+        logging.error(f"Fehler beim Lesen von {path}: {e}")
+        return path, content_hash, []
+
+def find_documents(roots):
+    for root in roots:
+        if os.path.isfile(root):
+            yield os.path.abspath(root)
+            continue
+        for directory, _, files in os.walk(root):
+            for name in sorted(files):
+                if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    yield os.path.abspath(os.path.join(directory, name))
+
+class DocumentIndex:
+    def __init__(self, directory=RAG_DIR, embed_model=RAG_EMBED_MODEL):
+        self.directory = directory
+        self.embed_model = embed_model
+        self.manifest_path = os.path.join(directory, 'index.json')
+        self.vectors_path = os.path.join(directory, 'vectors.npy')
+        self._lock = threading.Lock()
+        self.files = {}  # Pfad -> {'hash', 'rows'}
+        self.chunks = []  # Zeile -> {'path', 'text'} oder None (frei)
+        self.count = 0
+        self.vectors = None
+        self.active = np.zeros(0, dtype=bool)
+        self._load()
+
+    def __len__(self):
+        return int(self.active[:self.count].sum())
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"Dokumentindex konnte nicht gelesen werden: {e}")
+            return
+        if manifest.get('embed_model') != self.embed_model:
+            logging.info("Anderes Embedding-Modell, der Dokumentindex wird neu aufgebaut.")
+            return
+        self.files = manifest['files']
+        self.chunks = manifest['chunks']
+        self.count = manifest['count']
+        self.vectors = np.load(self.vectors_path, mmap_mode='r+')
+        self.active = np.array([chunk is not None for chunk in self.chunks] +
+                               [False] * (self.vectors.shape[0] - len(self.chunks)), dtype=bool)
+
+    def _save(self):
+        self.vectors.flush()
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'embed_model': self.embed_model, 'count': self.count, 'files': self.files, 'chunks': self.chunks}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _ensure_capacity(self, rows, dim):
+        if self.vectors is None:
+            os.makedirs(self.directory, exist_ok=True)
+            capacity = max(INITIAL_CAPACITY, rows)
+            self.vectors = np.lib.format.open_memmap(self.vectors_path, mode='w+', dtype=np.float32, shape=(capacity, dim))
+            self.active = np.zeros(capacity, dtype=bool)
+            return
+        if rows <= self.vectors.shape[0]:
+            return
+        # Kapazität verdoppeln: neue Datei anlegen, Inhalt kopieren, austauschen
+        capacity = max(rows, self.vectors.shape[0] * 2)
+        tmp_path = f"{self.vectors_path}.tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(capacity, self.vectors.shape[1]))
+        grown[:self.count] = self.vectors[:self.count]
+        grown.flush()
+        del grown
+        self.vectors = None  # mmap freigeben, bevor die Datei ersetzt wird
+        os.replace(tmp_path, self.vectors_path)
+        self.vectors = np.load(self.vectors_path, mmap_mode='r+')
+        self.active = np.concatenate([self.active, np.zeros(capacity - len(self.active), dtype=bool)])
+
+    def _embed(self, texts):
+        response = get_client().embed(model=self.embed_model, input=texts)
+        vectors = np.asarray(response['embeddings'], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _free_rows(self, path):
+        for row in self.files.pop(path, {}).get('rows', []):
+            self.chunks[row] = None
+            self.active[row] = False
+
+    def _compact(self):
+        """Entfernt freie Zeilen, wenn mehr als die Hälfte der Matrix ungenutzt ist."""
+        rows = np.flatnonzero(self.active[:self.count])
+        if self.count == 0 or len(rows) * 2 > self.count:
+            return
+        mapping = {int(old): new for new, old in enumerate(rows)}
+        self.vectors[:len(rows)] = self.vectors[rows]
+        self.chunks = [self.chunks[row] for row in rows]
+        for info in self.files.values():
+            info['rows'] = [mapping[row] for row in info['rows']]
+        self.count = len(rows)
+        self.active[:] = False
+        self.active[:self.count] = True
+
+    def index_paths(self, roots, on_progress=None, max_workers=None):
+        """Indexiert Dateien und Ordner inkrementell; liefert (neu eingebettete Dateien, Abschnitte)."""
+        paths = list(dict.fromkeys(find_documents(roots)))
+        with self._lock:
+            known = {path: self.files[path]['hash'] for path in paths if path in self.files}
+            # Gelöschte Dateien unterhalb der Wurzeln entfernen
+            prefixes = tuple(os.path.abspath(root) for root in roots)
+            for path in [path for path in self.files if path.startswith(prefixes) and path not in set(paths)]:
+                self._free_rows(path)
+
+        changed = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for path, content_hash, chunks in executor.map(hash_and_chunk, paths, [known.get(path) for path in paths]):
+                if chunks is not None:
+                    changed.append((path, content_hash, chunks))
+
+        total = sum(len(chunks) for _, _, chunks in changed)
+        done = 0
+        for path, content_hash, chunks in changed:
+            rows = []
+            for start in range(0, len(chunks), RAG_EMBED_BATCH):
+                batch = chunks[start:start + RAG_EMBED_BATCH]
+                vectors = self._embed(batch)
+                with self._lock:
+                    self._ensure_capacity(self.count + len(batch), vectors.shape[1])
+                    self.vectors[self.count:self.count + len(batch)] = vectors
+                    for text in batch:
+                        self.chunks.append({'path': path, 'text': text})
+                        rows.append(self.count)
+                        self.count += 1
+                done += len(batch)
+                if on_progress is not None:
+                    on_progress(done, total)
+            with self._lock:
+                self._free_rows(path)
+                self.files[path] = {'hash': content_hash, 'rows': rows}
+                self.active[rows] = True
+                self._save()
+        with self._lock:
+            if self.vectors is not None:
+                self._compact()
+                self._save()
+        logging.info(f"{len(changed)} Dokumente neu indexiert ({total} Abschnitte).")
+        return len(changed), total
+
+    def search(self, query, top_k=RAG_TOP_K):
+        """Kosinus-Ähnlichkeit gegen alle aktiven Abschnitte; liefert [(Score, Abschnitt), ...]."""
+        with self._lock:
+            if self.vectors is None or not self.active[:self.count].any():
+                return []
+        query_vector = self._embed([query])[0]
+        with self._lock:
+            scores = self.vectors[:self.count] @ query_vector
+            scores[~self.active[:self.count]] = -np.inf
+            k = min(top_k, int(self.active[:self.count].sum()))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [(float(scores[row]), self.chunks[row]) for row in best]
+
+    def build_context(self, query, max_tokens=RAG_CONTEXT_TOKENS):
+        """Text mit den passendsten Abschnitten, höchstens max_tokens lang (für den Prompt)."""
+        try:
+            results = self.search(query)
+        except Exception as e:
+            logging.error(f"Fehler bei der Dokumentsuche: {e}")
+            return ''
+        parts = []
+        tokens = 0
+        for _, chunk in results:
+            part = f"[{os.path.basename(chunk['path'])}]\n{chunk['text']}"
+            tokens += estimate_tokens(part)
+            if tokens > max_tokens:
+                break
+            parts.append(part)
+        if not parts:
+            return ''
+        return "Relevante Auszüge aus meinen Dokumenten:\n\n" + "\n\n".join(parts)
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """Liefert den gemeinsamen Dokumentindex."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DocumentIndex()
+        return _index
@@ -0,0 +1,201 @@
+"""Cache für Modellantworten auf wiederholte Anweisungen.
+
+Exakte Stufe: Schlüssel aus Modell, Optionen, normalisierter Benutzernachricht
+und einem Hash des übrigen Kontexts (Systemprompt, frühere Runden).
+Semantische Stufe (optional): Im selben Kontext wird eine frühere Antwort
+verwendet, wenn das Embedding der Nachricht ähnlich genug ist.
+Einträge verfallen nach RESPONSE_CACHE_TTL; wird RESPONSE_CACHE_MAX_BYTES
+überschritten, fallen die am längsten ungenutzten heraus.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from config import (RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_SEMANTIC,
+                    RESPONSE_CACHE_SIMILARITY, RAG_EMBED_MODEL)
+from ollama_client import get_client
+
+EXACT = 'exact'
+SEMANTIC = 'semantic'
+EVICTION_INTERVAL = 50  # Nach so vielen Einträgen werden TTL und Größe geprüft
+EMBEDDING_MEMO_SIZE = 64  # Embeddings der letzten Nachrichten für put() merken
+
+def normalize_prompt(text):
+    """Einheitliche Unicode-Form, Leerraum zusammengefasst."""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+def _hash(*parts):
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+def context_hash(messages):
+    """Hash über alle Nachrichten außer der letzten (der aktuellen Benutzernachricht)."""
+    return _hash([(message['role'], message['content']) for message in messages[:-1]])
+
+class ResponseCache:
+    def __init__(self, path=RESPONSE_CACHE_PATH, ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                 semantic=RESPONSE_CACHE_SEMANTIC, similarity=RESPONSE_CACHE_SIMILARITY, embed_model=RAG_EMBED_MODEL):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.semantic = semantic
+        self.similarity = similarity
+        self.embed_model = embed_model
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._embeddings = OrderedDict()  # Prompt-Hash -> normiertes Embedding (bytes)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, scope TEXT NOT NULL, prompt TEXT NOT NULL, response TEXT NOT NULL, '
+            'embedding BLOB, size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+        self._conn.commit()
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def _keys(model, messages, options):
+        # scope: alles außer der Nachricht selbst; nur innerhalb eines scope wird semantisch gesucht
+        scope = _hash(model, options or {}, context_hash(messages))
+        prompt = normalize_prompt(messages[-1]['content'])
+        return scope, prompt, _hash(scope, prompt)
+
+    def lookup(self, model, messages, options=None):
+        """Liefert (Antwort, EXACT|SEMANTIC) oder None; Datenbankfehler zählen als Fehltreffer."""
+        try:
+            return self._lookup(model, messages, options)
+        except sqlite3.Error as e:
+            # Z.B. "database is locked", wenn Oberfläche und batch.py dieselbe Datei benutzen
+            logging.warning(f"Antwort-Cache nicht lesbar, es wird normal generiert: {e}")
+            self._rollback()
+            return None
+
+    def put(self, model, messages, response, options=None):
+        """Speichert die Antwort; schlägt das fehl, fehlt sie eben im Cache."""
+        try:
+            self._put(model, messages, response, options)
+        except sqlite3.Error as e:
+            logging.warning(f"Antwort konnte nicht im Cache gespeichert werden: {e}")
+            self._rollback()
+
+    def _lookup(self, model, messages, options):
+        scope, prompt, key = self._keys(model, messages, options)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response FROM responses WHERE key = ? AND created >= ?', (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                self._touch(key, now)
+                return row[0], EXACT
+        if not self.semantic:
+            return None
+        embedding = self._embed(prompt, key)
+        if embedding is None:
+            return None
+        import numpy as np  # Nur für die semantische Stufe
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, response, embedding FROM responses '
+                'WHERE scope = ? AND embedding IS NOT NULL AND created >= ?', (scope, now - self.ttl)
+            ).fetchall()
+            if not rows:
+                return None
+            matrix = np.frombuffer(b''.join(row[2] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+            if matrix.shape[1] != len(embedding) // 4:
+                return None  # Anderes Embedding-Modell
+            scores = matrix @ np.frombuffer(embedding, dtype=np.float32)
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity:
+                return None
+            self._touch(rows[best][0], now)
+            logging.info(f"Semantischer Cache-Treffer (Ähnlichkeit {scores[best]:.3f}).")
+            return rows[best][1], SEMANTIC
+
+    def _put(self, model, messages, response, options):
+        scope, prompt, key = self._keys(model, messages, options)
+        embedding = self._embed(prompt, key) if self.semantic else None
+        size = len(prompt.encode('utf-8')) + len(response.encode('utf-8')) + len(embedding or b'')
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, scope, prompt, response, embedding, size, now, now)
+            )
+            self._inserts += 1
+            if self._inserts % EVICTION_INTERVAL == 0:
+                self._evict()
+            self._conn.commit()
+
+    def _rollback(self):
+        with self._lock:
+            try:
+                self._conn.rollback()
+            except sqlite3.Error:
+                pass
+
+    def _touch(self, key, now):
+        self._conn.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+        self._conn.commit()
+
+    def _evict(self):
+        """Abgelaufene Einträge löschen, dann die ältesten, bis die Größengrenze passt."""
+        self._conn.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.ttl,))
+        self._conn.execute(
+            'DELETE FROM responses WHERE key IN (SELECT key FROM '
+            '(SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS total FROM responses) WHERE total > ?)',
+            (self.max_bytes,)
+        )
+        self._conn.commit()
+
+    def _embed(self, prompt, key):
+        """Normiertes Embedding als float32-Bytes; None, wenn das Embedding-Modell fehlt."""
+        with self._lock:
+            if key in self._embeddings:
+                self._embeddings.move_to_end(key)
+                return self._embeddings[key]
+        try:
+            import numpy as np
+            vector = np.asarray(get_client().embed(model=self.embed_model, input=[prompt])['embeddings'][0],
+                                dtype=np.float32)
+        except Exception as e:
+            logging.error(f"Embedding für den Antwort-Cache fehlgeschlagen: {e}")
+            return None
+        embedding = (vector / max(float(np.linalg.norm(vector)), 1e-12)).tobytes()
+        with self._lock:
+            self._embeddings[key] = embedding
+            while len(self._embeddings) > EMBEDDING_MEMO_SIZE:
+                self._embeddings.popitem(last=False)
+        return embedding
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Liefert den gemeinsamen Antwort-Cache; None, wenn die Datenbank nicht geöffnet werden kann."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ResponseCache()
+            except sqlite3.Error as e:
+                logging.error(f"Antwort-Cache nicht verfügbar: {e}")
+                return None
+        return _cache
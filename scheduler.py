@@ -0,0 +1,174 @@
+"""Warteschlange und Scheduler für Generierungen.
+
+Aufträge haben eine Priorität (kleiner = wichtiger), ein Modell und optional
+eine Gruppe. Pro Modell laufen höchstens SCHEDULER_MAX_PER_MODEL Aufträge
+gleichzeitig, pro Gruppe (z.B. ein Gespräch) immer nur einer. Ein neuer
+Auftrag mit supersede=True bricht wartende Aufträge derselben Gruppe ab.
+"""
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import SCHEDULER_WORKERS, SCHEDULER_MAX_PER_MODEL
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+class Job:
+    _ids = itertools.count(1)
+
+    def __init__(self, func, model, priority, group, key, on_status):
+        self.id = next(self._ids)
+        self.func = func  # func(cancel_event) -> Ergebnis
+        self.model = model
+        self.priority = priority
+        self.group = group
+        self.key = key  # Gleicher Schlüssel = gleicher Auftrag (Duplikate werden verworfen)
+        self.on_status = on_status
+        self.status = QUEUED
+        self.cancel_event = threading.Event()
+        self.result = None
+        self.error = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, CANCELLED, FAILED)
+
+class GenerationScheduler:
+    def __init__(self, max_workers=SCHEDULER_WORKERS, max_per_model=SCHEDULER_MAX_PER_MODEL):
+        self.max_workers = max_workers
+        self.max_per_model = max_per_model
+        self._queue = []  # Heap aus (Priorität, Reihenfolge, Job)
+        self._order = itertools.count()
+        self._running = []
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='generation')
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='scheduler', daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, func, model, priority=PRIORITY_INTERACTIVE, group=None, key=None, supersede=False, on_status=None):
+        """Stellt einen Auftrag in die Warteschlange; liefert den Job oder einen gleichen, bereits wartenden."""
+        superseded = []
+        with self._condition:
+            if key is not None:
+                for job in self._active_jobs():
+                    if job.key == key and not job.cancel_event.is_set():
+                        return job
+            if supersede and group is not None:
+                superseded = [job for _, _, job in self._queue if job.group == group]
+                self._queue = [entry for entry in self._queue if entry[2].group != group]
+                heapq.heapify(self._queue)
+            job = Job(func, model, priority, group, key, on_status)
+            heapq.heappush(self._queue, (priority, next(self._order), job))
+            self._condition.notify()
+        for old in superseded:
+            old.cancel_event.set()
+            self._set_status(old, CANCELLED)
+        return job
+
+    def cancel(self, job):
+        job.cancel_event.set()
+        with self._condition:
+            queued = any(entry[2] is job for entry in self._queue)
+            if queued:
+                self._queue = [entry for entry in self._queue if entry[2] is not job]
+                heapq.heapify(self._queue)
+        if queued:
+            self._set_status(job, CANCELLED)
+
+    def cancel_group(self, group):
+        with self._condition:
+            jobs = [job for job in self._active_jobs() if job.group == group]
+        for job in jobs:
+            self.cancel(job)
+
+    def snapshot(self):
+        """(wartende Jobs, laufende Jobs) für die Statusanzeige."""
+        with self._condition:
+            return [job for _, _, job in sorted(self._queue)], list(self._running)
+
+    def shutdown(self, wait=True):
+        with self._condition:
+            self._stopped = True
+            jobs = self._active_jobs()
+            self._condition.notify_all()
+        for job in jobs:
+            self.cancel(job)
+        self._executor.shutdown(wait=wait)
+
+    def _active_jobs(self):
+        return [job for _, _, job in self._queue] + self._running
+
+    def _next_runnable(self):
+        if len(self._running) >= self.max_workers:
+            return None
+        running_models = [job.model for job in self._running]
+        running_groups = {job.group for job in self._running if job.group is not None}
+        for entry in sorted(self._queue):
+            job = entry[2]
+            if job.group in running_groups:
+                continue
+            if job.model is not None and running_models.count(job.model) >= self.max_per_model:
+                continue
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            return job
+        return None
+
+    def _dispatch_loop(self):
+        while True:
+            with self._condition:
+                job = None
+                while not self._stopped:
+                    job = self._next_runnable()
+                    if job is not None:
+                        break
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                self._running.append(job)
+            self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        self._set_status(job, RUNNING)
+        status = DONE
+        try:
+            job.result = job.func(job.cancel_event)
+            if job.cancel_event.is_set():
+                status = CANCELLED
+        except Exception as e:
+            logging.error(f"Fehler im Auftrag {job.id} ({job.model}): {e}")
+            job.error = e
+            status = FAILED
+        finally:
+            with self._condition:
+                self._running.remove(job)
+                self._condition.notify()
+        self._set_status(job, status)
+
+    def _set_status(self, job, status):
+        job.status = status
+        if job.on_status is not None:
+            try:
+                job.on_status(job)
+            except Exception as e:
+                logging.error(f"Fehler im Status-Rückruf von Auftrag {job.id}: {e}")
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Liefert den gemeinsamen Scheduler."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = GenerationScheduler()
+        return _scheduler
@@ -0,0 +1,247 @@
+"""HTTP-Server für den Chatbot ohne Oberfläche (asyncio, Server-Sent Events).
+
+Jede Sitzung hat ihren eigenen Dialogkontext; die Runden aller Sitzungen laufen
+über den gemeinsamen Scheduler gegen einen Ollama-Server.
+
+    python server.py --port 8765
+
+    POST   /sessions                 {"model", "language", "pipelined", "use_cache", "use_documents"}
+    GET    /sessions/<id>            Einstellungen und Kontext
+    DELETE /sessions/<id>            Sitzung beenden (laufende Runde wird abgebrochen)
+    POST   /sessions/<id>/reset      Neues Gespräch in derselben Sitzung
+    POST   /sessions/<id>/messages   {"text", "stream": true} -> text/event-stream
+    GET    /models, /health, /metrics
+
+Ereignisse des Streams: anweisung (übersetzte Anweisung), chunk (Text),
+done (Anweisung, Antwort, Span), cancelled, error.
+"""
+import argparse
+import asyncio
+import json
+import logging
+from http import HTTPStatus
+from chat_core import SessionManager, LANGUAGE_MAP
+from config import (SERVER_HOST, SERVER_PORT, SERVER_MAX_SESSIONS, SERVER_SESSION_IDLE, SERVER_MAX_BODY,
+                    PIPELINED_TRANSLATION, RESPONSE_CACHE)
+from model_registry import get_registry
+from ollama_client import set_host, close_client
+from pipeline import PipelineError
+from scheduler import get_scheduler, PRIORITY_INTERACTIVE, CANCELLED
+from telemetry import configure_logging, build_span, metrics
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class ChatServer:
+    def __init__(self, sessions=None, scheduler=None):
+        self.sessions = sessions or SessionManager(SERVER_MAX_SESSIONS, SERVER_SESSION_IDLE)
+        self.scheduler = scheduler or get_scheduler()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            method, path, body = await self.read_request(reader)
+            await self.route(method, path, body, writer)
+        except HttpError as e:
+            await self.send_json(writer, e.status, {'error': e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logging.exception(f"Fehler im HTTP-Server: {e}")
+            await self.send_json(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)})
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def read_request(reader):
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Ungültige Anfrage')
+        method, path, _ = request_line
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = headers.get('content-length') or '0'
+        if not length.isdigit():
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Ungültige Content-Length')
+        length = int(length)
+        if length > SERVER_MAX_BODY:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Anfrage zu groß')
+        body = {}
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except ValueError:
+                raise HttpError(HTTPStatus.BAD_REQUEST, 'Kein gültiges JSON')
+            if not isinstance(body, dict):
+                raise HttpError(HTTPStatus.BAD_REQUEST, 'JSON-Objekt erwartet')
+        return method, path.split('?')[0], body
+
+    async def route(self, method, path, body, writer):
+        parts = [part for part in path.split('/') if part]
+        if method == 'GET' and parts == ['health']:
+            await self.send_json(writer, HTTPStatus.OK, {'status': 'ok', 'sessions': len(self.sessions)})
+        elif method == 'GET' and parts == ['metrics']:
+            await self.send(writer, HTTPStatus.OK, 'text/plain; version=0.0.4; charset=utf-8', metrics.render().encode('utf-8'))
+        elif method == 'GET' and parts == ['models']:
+            models = await asyncio.to_thread(get_registry().refresh)
+            await self.send_json(writer, HTTPStatus.OK, {'models': models, 'languages': list(LANGUAGE_MAP)})
+        elif method == 'POST' and parts == ['sessions']:
+            await self.create_session(body, writer)
+        elif parts[:1] == ['sessions'] and len(parts) >= 2:
+            session = self.sessions.get(parts[1])
+            if session is None:
+                raise HttpError(HTTPStatus.NOT_FOUND, 'Sitzung nicht gefunden')
+            if method == 'GET' and len(parts) == 2:
+                await self.send_json(writer, HTTPStatus.OK, session.info())
+            elif method == 'DELETE' and len(parts) == 2:
+                self.sessions.remove(session.id)
+                self.scheduler.cancel_group(session.id)
+                await self.send_json(writer, HTTPStatus.OK, {'deleted': session.id})
+            elif method == 'POST' and parts[2:] == ['reset']:
+                self.scheduler.cancel_group(session.id)
+                session.reset()
+                await self.send_json(writer, HTTPStatus.OK, session.info())
+            elif method == 'POST' and parts[2:] == ['messages']:
+                await self.run_message(session, body, writer)
+            else:
+                raise HttpError(HTTPStatus.NOT_FOUND, 'Unbekannter Pfad')
+        else:
+            raise HttpError(HTTPStatus.NOT_FOUND, 'Unbekannter Pfad')
+
+    async def create_session(self, body, writer):
+        model = body.get('model')
+        if not model or not isinstance(model, str):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'model fehlt')
+        if not isinstance(body.get('language', 'Deutsch'), str):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'language muss ein Text sein')
+        try:
+            session = self.sessions.create(
+                model=model,
+                language=body.get('language', 'Deutsch'),
+                pipelined=bool(body.get('pipelined', PIPELINED_TRANSLATION)),
+                use_cache=bool(body.get('use_cache', RESPONSE_CACHE)),
+                use_documents=bool(body.get('use_documents', False)),
+            )
+        except ValueError as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, str(e))
+        except RuntimeError as e:
+            raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, str(e))
+        await self.send_json(writer, HTTPStatus.CREATED, session.info())
+
+    async def run_message(self, session, body, writer):
+        text = body.get('text') or ''
+        text = text.strip() if isinstance(text, str) else ''
+        if not text:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'text fehlt')
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        emit = lambda event, data: loop.call_soon_threadsafe(events.put_nowait, (event, data))
+        stats = {}
+
+        def turn(cancel_event):
+            # Läuft in einem Thread des Schedulers
+            try:
+                result = session.run_turn(
+                    text,
+                    on_anweisung=lambda anweisung: emit('anweisung', {'text': anweisung}),
+                    on_chunk=None if session.pipelined else lambda chunk: emit('chunk', {'text': chunk}),
+                    on_segment=lambda segment: emit('chunk', {'text': segment}),  # Übersetzte Sätze (Pipeline-Modus)
+                    cancel_event=cancel_event,
+                    stats=stats,
+                )
+            except PipelineError as e:
+                emit('error', {'title': e.title, 'message': e.message})
+                return
+            except Exception as e:
+                logging.exception(f"Fehler in Sitzung {session.id}: {e}")
+                emit('error', {'title': 'Fehler', 'message': str(e)})
+                return
+            if result is None:
+                emit('cancelled', {})
+            else:
+                emit('done', {'anweisung': result[0], 'text': result[1], 'span': build_span(session.model, stats)})
+
+        def status_changed(job):
+            if job.status == CANCELLED:
+                emit('cancelled', {})  # Auch wenn der Auftrag noch wartete; doppelte Meldungen schaden nicht
+
+        job = self.scheduler.submit(turn, session.model, PRIORITY_INTERACTIVE, group=session.id, on_status=status_changed)
+        try:
+            if body.get('stream', True):
+                await self.send_headers(writer, HTTPStatus.OK, 'text/event-stream', {'Cache-Control': 'no-cache'})
+                while True:
+                    event, data = await events.get()
+                    writer.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+                    await writer.drain()
+                    if event in ('done', 'cancelled', 'error'):
+                        break
+            else:
+                while True:
+                    event, data = await events.get()
+                    if event in ('done', 'cancelled', 'error'):
+                        break
+                status = {'done': HTTPStatus.OK, 'cancelled': HTTPStatus.CONFLICT}.get(event, HTTPStatus.BAD_GATEWAY)
+                await self.send_json(writer, status, {'event': event, **data})
+        except (ConnectionError, asyncio.CancelledError):
+            self.scheduler.cancel(job)  # Client ist weg
+            raise
+
+    async def send_headers(self, writer, status, content_type, extra=None):
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in (extra or {}).items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+    async def send(self, writer, status, content_type, body):
+        await self.send_headers(writer, status, content_type, {'Content-Length': len(body)})
+        writer.write(body)
+        await writer.drain()
+
+    async def send_json(self, writer, status, data):
+        await self.send(writer, status, 'application/json; charset=utf-8',
+                        json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    async def expire_sessions(self):
+        while True:
+            await asyncio.sleep(60)
+            for session_id in self.sessions.expire():
+                self.scheduler.cancel_group(session_id)
+                logging.info(f"Sitzung {session_id} verfallen.")
+
+async def serve(host, port):
+    chat_server = ChatServer()
+    server = await asyncio.start_server(chat_server.handle_connection, host, port)
+    expiry = asyncio.create_task(chat_server.expire_sessions())
+    print(f"Chatbot-Server läuft auf http://{host}:{server.sockets[0].getsockname()[1]}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        expiry.cancel()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Chatbot als HTTP-Server (Server-Sent Events) ohne Oberfläche.')
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--ollama-host', help='Anderer Ollama-Server als OLLAMA_HOST')
+    args = parser.parse_args(argv)
+    configure_logging()
+    if args.ollama_host:
+        set_host(args.ollama_host)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        get_scheduler().shutdown(wait=False)
+        close_client()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Messung der Startzeit der Oberfläche.
+
+main.py importiert dieses Modul als Erstes; mark() hält danach Zeitpunkte
+relativ zu diesem Import fest (Importe, Fensteraufbau, erstes Zeichnen).
+run_report() startet main.py erneut mit `python -X importtime`, beendet es nach
+dem ersten Zeichnen und fasst die Importzeiten je Paket zusammen:
+
+    python main.py --startup-report
+"""
+import sys
+import time
+
+MARK_PREFIX = 'startup-mark:'
+
+_t0 = time.perf_counter()
+_marks = []
+
+def mark(name):
+    """Hält einen Zeitpunkt (Sekunden seit Programmstart) fest."""
+    _marks.append((name, time.perf_counter() - _t0))
+
+def print_marks():
+    """Gibt die Zeitpunkte maschinenlesbar für run_report() aus."""
+    for name, elapsed in _marks:
+        print(f"{MARK_PREFIX}{name}={elapsed:.6f}", flush=True)
+
+def parse_marks(output):
+    marks = []
+    for line in output.splitlines():
+        if line.startswith(MARK_PREFIX):
+            name, _, elapsed = line[len(MARK_PREFIX):].rpartition('=')
+            marks.append((name, float(elapsed)))
+    return marks
+
+def parse_importtime(output):
+    """Summiert die Ausgabe von -X importtime je Paket.
+
+    Gezählt werden nur Importe der obersten Ebene (direkt von main.py oder beim
+    Interpreterstart ausgelöst); ihre kumulierte Zeit enthält alle Unterimporte.
+    Liefert {Paket: Mikrosekunden}.
+    """
+    totals = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue  # Kopfzeile
+        name = parts[2].rstrip()[1:]
+        if name.startswith(' '):
+            continue  # Unterimport, steckt schon in der kumulierten Zeit
+        package = name.split('.')[0]
+        totals[package] = totals.get(package, 0) + cumulative
+    return totals
+
+def run_report(script, top=15):
+    """Misst einen Kaltstart von script und gibt den Bericht aus."""
+    import subprocess
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', script, '--startup-exit'],
+                            capture_output=True, text=True, timeout=120)
+    wall = time.perf_counter() - started
+    marks = parse_marks(result.stdout)
+    if result.returncode != 0 or not marks:
+        print(result.stderr[-2000:], file=sys.stderr)
+        print("Startmessung fehlgeschlagen.", file=sys.stderr)
+        return result.returncode or 1
+
+    imports = sorted(parse_importtime(result.stderr).items(), key=lambda item: item[1], reverse=True)
+    print(f"Importzeiten (kumuliert, Top {top}):")
+    for package, micros in imports[:top]:
+        print(f"  {package:<30} {micros / 1000:8.1f} ms")
+    print(f"  {'gesamt':<30} {sum(micros for _, micros in imports) / 1000:8.1f} ms")
+    print("Zeitpunkte seit Programmstart:")
+    previous = 0.0
+    for name, elapsed in marks:
+        print(f"  {name:<30} {elapsed * 1000:8.1f} ms  (+{(elapsed - previous) * 1000:.1f} ms)")
+        previous = elapsed
+    print(f"Prozess inkl. Interpreterstart und Beenden: {wall * 1000:.1f} ms")
+    return 0
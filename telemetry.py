@@ -0,0 +1,197 @@
+"""Protokoll, Spans und Metriken.
+
+Jede Gesprächsrunde ergibt einen Span mit den Dauern der Schritte
+(Übersetzung hin, Laden, Prompt-Auswertung, Generierung, Übersetzung zurück);
+Laden und Auswertung stammen aus den Zählern des Ollama-Servers
+(load_duration, prompt_eval_duration, eval_count, eval_duration).
+Protokolliert wird über eine Warteschlange: der aufrufende Thread legt den
+Eintrag unformatiert ab und wartet nicht auf die Festplatte, ein
+Hintergrund-Thread formatiert ihn und schreibt JSON-Zeilen in eine rotierende
+Datei. Die Zähler stehen optional als
+Prometheus-Text unter http://127.0.0.1:<METRICS_PORT>/metrics bereit.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from config import LOG_PATH, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUPS
+
+# Phasen eines Spans: Name -> (Schlüssel in stats, Faktor auf Sekunden)
+PHASES = {
+    'translate_in': ('translate_in', 1),
+    'retrieval': ('retrieval', 1),
+    'load': ('load_duration', 1e-9),
+    'prompt_eval': ('prompt_eval_duration', 1e-9),
+    'eval': ('eval_duration', 1e-9),
+    'translate_out': ('translate_out', 1),
+}
+
+class JsonFormatter(logging.Formatter):
+    """Eine JSON-Zeile pro Eintrag; Spans landen unter 'span'."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        span = getattr(record, 'span', None)
+        if span is not None:
+            entry['span'] = span
+        return json.dumps(entry, ensure_ascii=False)
+
+_listener = None
+
+def configure_logging(path=LOG_PATH, level=LOG_LEVEL):
+    """Leitet das Protokoll über eine Warteschlange in eine rotierende JSON-Datei (einmalig)."""
+    global _listener
+    if _listener is not None:
+        return
+    import logging.handlers  # Zieht socket nach; erst nach dem Start laden
+
+    class DeferredQueueHandler(logging.handlers.QueueHandler):
+        def prepare(self, record):
+            # QueueHandler.prepare() formatiert schon im aufrufenden Thread (für Queues über
+            # Prozessgrenzen); hier bleibt alles im Prozess, das erledigt der QueueListener
+            return record
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                                        encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # Restliche Einträge noch schreiben
+    root = logging.getLogger()
+    root.addHandler(DeferredQueueHandler(records))
+    root.setLevel(level)
+
+def build_span(model, stats, status='ok'):
+    """Fasst die stats einer Runde (siehe pipeline.run_turn) zu einem Span zusammen."""
+    phases = {}
+    for name, (key, factor) in PHASES.items():
+        if stats.get(key) is not None:
+            phases[name] = round(stats[key] * factor, 4)
+    eval_count = stats.get('eval_count') or 0
+    eval_duration = stats.get('eval_duration') or 0
+    span = {
+        'model': model,
+        'status': status,
+        'cache': stats.get('cache'),
+        'total': round(stats['total'], 4) if stats.get('total') is not None else None,
+        'first_token': round(stats['first_token'], 4) if stats.get('first_token') is not None else None,
+        'phases': phases,
+        'prompt_tokens': stats.get('prompt_eval_count'),
+        'tokens': stats.get('eval_count'),
+        'tokens_per_sec': round(eval_count / (eval_duration / 1e9), 2) if eval_duration else None,
+    }
+    return span
+
+class Metrics:
+    """Zähler und Summen für den Prometheus-Endpunkt (threadsicher)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = {}  # (Modell, Status) -> Anzahl
+        self.cache_hits = {}  # Stufe -> Anzahl
+        self.tokens = {}  # Modell -> erzeugte Tokens
+        self.tokens_per_sec = {}  # Modell -> letzter Wert
+        self.phase_sums = {}  # Phase -> (Summe Sekunden, Anzahl)
+
+    def observe(self, span):
+        with self._lock:
+            key = (span['model'], span['status'])
+            self.turns[key] = self.turns.get(key, 0) + 1
+            if span['cache']:
+                self.cache_hits[span['cache']] = self.cache_hits.get(span['cache'], 0) + 1
+            if span['tokens']:
+                self.tokens[span['model']] = self.tokens.get(span['model'], 0) + span['tokens']
+            if span['tokens_per_sec'] is not None:
+                self.tokens_per_sec[span['model']] = span['tokens_per_sec']
+            for phase, seconds in span['phases'].items():
+                total, count = self.phase_sums.get(phase, (0.0, 0))
+                self.phase_sums[phase] = (total + seconds, count + 1)
+
+    def render(self):
+        """Prometheus-Textformat (Version 0.0.4)."""
+        def label(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        lines = []
+        with self._lock:
+            lines += ['# HELP chatbot_turns_total Gesprächsrunden nach Modell und Ergebnis.',
+                      '# TYPE chatbot_turns_total counter']
+            lines += [f'chatbot_turns_total{{model="{label(model)}",status="{status}"}} {count}'
+                      for (model, status), count in sorted(self.turns.items())]
+            lines += ['# HELP chatbot_cache_hits_total Antworten aus dem Antwort-Cache.',
+                      '# TYPE chatbot_cache_hits_total counter']
+            lines += [f'chatbot_cache_hits_total{{tier="{tier}"}} {count}' for tier, count in sorted(self.cache_hits.items())]
+            lines += ['# HELP chatbot_generated_tokens_total Vom Modell erzeugte Tokens.',
+                      '# TYPE chatbot_generated_tokens_total counter']
+            lines += [f'chatbot_generated_tokens_total{{model="{label(model)}"}} {count}'
+                      for model, count in sorted(self.tokens.items())]
+            lines += ['# HELP chatbot_tokens_per_second Generierungsgeschwindigkeit der letzten Runde.',
+                      '# TYPE chatbot_tokens_per_second gauge']
+            lines += [f'chatbot_tokens_per_second{{model="{label(model)}"}} {value}'
+                      for model, value in sorted(self.tokens_per_sec.items())]
+            lines += ['# HELP chatbot_phase_seconds Dauer der Schritte einer Runde.',
+                      '# TYPE chatbot_phase_seconds summary']
+            for phase, (total, count) in sorted(self.phase_sums.items()):
+                lines.append(f'chatbot_phase_seconds_sum{{phase="{phase}"}} {total:.6f}')
+                lines.append(f'chatbot_phase_seconds_count{{phase="{phase}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+span_logger = logging.getLogger('telemetry')
+
+def record_span(span):
+    metrics.observe(span)
+    span_logger.info(f"Runde {span['status']}: {span['model']}", extra={'span': span})
+
+@contextmanager
+def trace_turn(model, stats, cancel_event=None):
+    """Misst eine Runde und zeichnet ihren Span auf, auch bei Abbruch oder Fehler."""
+    started = time.perf_counter()
+    status = 'failed'
+    try:
+        yield
+        status = 'cancelled' if cancel_event is not None and cancel_event.is_set() else 'ok'
+    finally:
+        stats['total'] = time.perf_counter() - started
+        record_span(build_span(model, stats, status))
+
+_metrics_server = None
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Startet den /metrics-Endpunkt in einem Hintergrund-Thread; liefert den Server."""
+    global _metrics_server
+    if _metrics_server is not None:
+        return _metrics_server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Abrufe nicht protokollieren
+
+    _metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+    _metrics_server.daemon_threads = True
+    threading.Thread(target=_metrics_server.serve_forever, name='metrics', daemon=True).start()
+    logging.info(f"Metriken unter http://{host}:{_metrics_server.server_address[1]}/metrics")
+    return _metrics_server
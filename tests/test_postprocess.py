@@ -0,0 +1,135 @@
+"""Tests für postprocess: gleiche Ausgabe, egal wie der Text in Stücke geschnitten ist."""
+import itertools
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from postprocess import make_chain, clean_text, StopFilter, ThinkFilter, EdgeFilter
+
+STOPS = ['<|im_end|>', '<|eot_id|>', '</s>']
+
+def chain():
+    return make_chain(stop_sequences=STOPS, hide_thinking=True)
+
+def clean(text):
+    return clean_text(text, stop_sequences=STOPS, hide_thinking=True)
+
+def feed_chunks(stream_filter, chunks):
+    """Wie pipeline.run_turn: Stücke einspeisen, bei einer Stoppsequenz aufhören, am Ende flush()."""
+    output = []
+    for chunk in chunks:
+        output.append(stream_filter.feed(chunk))
+        if stream_filter.stopped:
+            break
+    output.append(stream_filter.flush())
+    return ''.join(output)
+
+def split_at(text, cuts):
+    bounds = [0, *cuts, len(text)]
+    return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+
+def all_two_splits(text):
+    return [split_at(text, [cut]) for cut in range(len(text) + 1)]
+
+def all_three_splits(text):
+    return [split_at(text, cuts) for cuts in itertools.combinations_with_replacement(range(len(text) + 1), 2)]
+
+@pytest.mark.parametrize('chunks', all_three_splits('Vorher<think>geheim</think>Nachher'))
+def test_think_tags_split_across_chunks(chunks):
+    assert feed_chunks(ThinkFilter(), chunks) == 'VorherNachher'
+
+def test_think_tag_one_character_per_chunk():
+    assert feed_chunks(ThinkFilter(), list('a<think>x</think>b<think>y</think>c')) == 'abc'
+
+def test_incomplete_think_tag_at_end_is_text():
+    assert feed_chunks(ThinkFilter(), ['Text <thi']) == 'Text <thi'
+
+def test_open_think_block_stays_hidden():
+    assert feed_chunks(ThinkFilter(), ['Antwort<think>', 'noch am Denken']) == 'Antwort'
+
+@pytest.mark.parametrize('chunks', all_three_splits('Die Antwort.<|im_end|>Rest'))
+def test_stop_sequence_split_across_chunks(chunks):
+    stop_filter = StopFilter(STOPS)
+    assert feed_chunks(stop_filter, chunks) == 'Die Antwort.'
+    assert stop_filter.stopped
+    assert stop_filter.matched == '<|im_end|>'
+
+def test_earliest_stop_sequence_wins():
+    stop_filter = StopFilter(STOPS)
+    assert feed_chunks(stop_filter, ['a</s>b<|im_end|>c']) == 'a'
+    assert stop_filter.matched == '</s>'
+
+def test_partial_stop_sequence_at_end_is_text():
+    stop_filter = StopFilter(STOPS)
+    assert feed_chunks(stop_filter, ['Ende <|eot_', 'id']) == 'Ende <|eot_id'
+    assert not stop_filter.stopped
+
+@pytest.mark.parametrize('text', [
+    'Durchgestrichen: <s>alt</s> neu. Fertig.',
+    'Ein Modell mit <|end|> im Text',
+])
+def test_default_stop_sequences_keep_ordinary_text(text):
+    assert clean_text(text) == text
+    chunks = split_at(text, [text.index('<') + 2])
+    default_chain = make_chain()
+    assert feed_chunks(default_chain, chunks) == text
+    assert not default_chain.stopped
+
+@pytest.mark.parametrize('chunks', all_three_splits('Ergebnis\n.'))
+def test_trailing_dot_line_split_across_chunks(chunks):
+    assert feed_chunks(EdgeFilter(), chunks) == 'Ergebnis'
+
+@pytest.mark.parametrize('chunks', all_two_splits('Zeile\n.\nWeiter'))
+def test_dot_line_in_the_middle_is_kept(chunks):
+    assert feed_chunks(EdgeFilter(), chunks) == 'Zeile\n.\nWeiter'
+
+@pytest.mark.parametrize('text, expected', [
+    ('  "Hallo Welt."  ', 'Hallo Welt.'),
+    ('\n\n"Zitat" und "mehr"\n', 'Zitat" und "mehr'),
+    ('Er sagte "hi"', 'Er sagte "hi'),
+    ('\t Text \r\n', 'Text'),
+    ('"""', ''),
+    ('  ', ''),
+])
+def test_leading_and_trailing_quotes_and_whitespace(text, expected):
+    assert clean(text) == expected
+    for chunks in all_two_splits(text):
+        assert feed_chunks(EdgeFilter(), chunks) == expected
+
+def test_inner_whitespace_is_kept():
+    assert feed_chunks(EdgeFilter(), ['Ein', '  ', ' ', 'Satz']) == 'Ein   Satz'
+
+SAMPLES = [
+    '  "Hallo Welt."\n.',
+    '<think>abc</think>Antwort hier',
+    'Text <thi',
+    'a<think>b</thi',
+    'x</s>y',
+    'foo <|im_end|> bar',
+    '"Zitat" und "mehr"  ',
+    'Zeile\n.\nMehr',
+    'Ende mit\n. ',
+    'A<<think>>B',
+    '<think>x</think><think>y</think>Z',
+    'abc\n\n.',
+    'a \n .',
+    '<|eot_id',
+    'abc.\n.\n.',
+    '\n.\n.',
+    '  <think> denken </think>  "Antwort"\n.<|im_end|>Rest',
+]
+
+@pytest.mark.parametrize('text', SAMPLES)
+def test_any_chunking_matches_clean_text(text):
+    expected = clean(text)
+    for chunks in all_three_splits(text):
+        assert feed_chunks(chain(), chunks) == expected, chunks
+    rng = random.Random(text)
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(len(text) + 1), rng.randint(0, len(text) + 1)))
+        chunks = split_at(text, cuts)
+        assert feed_chunks(chain(), chunks) == expected, chunks
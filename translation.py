@@ -0,0 +1,186 @@
+"""Übersetzung mit lokalem Cache, Spracherkennung und austauschbarem Backend."""
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from config import TRANSLATION_BACKEND, TRANSLATION_CACHE_PATH, TRANSLATION_CACHE_MAX_ENTRIES, TRANSLATION_CHUNK_CHARS
+
+EVICTION_INTERVAL = 100  # Nach so vielen Einträgen wird die LRU-Grenze geprüft
+
+# Häufige Funktionswörter für eine schnelle, netzwerkfreie Spracherkennung
+STOPWORDS = {
+    'de': {'der', 'die', 'das', 'und', 'ist', 'nicht', 'ich', 'du', 'ein', 'eine', 'zu', 'mit', 'auf', 'für', 'von', 'sich', 'den', 'dem', 'auch', 'wie', 'bitte', 'sind', 'wird'},
+    'en': {'the', 'and', 'is', 'are', 'not', 'you', 'of', 'to', 'with', 'for', 'on', 'this', 'that', 'be', 'it', 'what', 'how', 'please', 'was', 'will', 'have'},
+    'fr': {'le', 'la', 'les', 'et', 'est', 'pas', 'je', 'vous', 'une', 'des', 'du', 'pour', 'avec', 'sur', 'que', 'qui', 'ce', 'dans', 'sont', 'il', 'au'},
+    'es': {'el', 'los', 'las', 'y', 'es', 'no', 'yo', 'usted', 'una', 'del', 'para', 'con', 'que', 'por', 'lo', 'se', 'como', 'pero', 'muy', 'son', 'está'},
+    'it': {'il', 'lo', 'gli', 'e', 'è', 'non', 'io', 'una', 'di', 'della', 'per', 'con', 'che', 'sono', 'come', 'ma', 'molto', 'questo', 'nel', 'alla', 'anche'},
+    'la': {'et', 'est', 'non', 'ego', 'tu', 'ad', 'cum', 'quod', 'sed', 'enim', 'atque', 'sunt', 'esse', 'quae', 'qui', 'ut', 'nec', 'autem', 'ab', 'ex', 'quam'},
+}
+MIN_DETECTION_HITS = 3
+
+def detect_language(text):
+    """Schätzt die Sprache anhand von Funktionswörtern; None, wenn unsicher."""
+    words = re.findall(r"\w+", text.lower())
+    scores = {lang: sum(1 for word in words if word in stopwords) for lang, stopwords in STOPWORDS.items()}
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best, best_score), (_, second_score) = ranked[0], ranked[1]
+    if best_score >= MIN_DETECTION_HITS and best_score >= 2 * second_score:
+        return best
+    return None
+
+def split_into_chunks(text, max_chars=TRANSLATION_CHUNK_CHARS):
+    """Teilt text an Absatz- bzw. Satzgrenzen; ''.join(chunks) == text."""
+    pieces = re.split(r'(?<=\n\n)|(?<=[.!?]\s)', text)
+    chunks = []
+    current = ''
+    for piece in pieces:
+        while len(piece) > max_chars:  # Sehr lange Sätze hart teilen
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(piece[:max_chars])
+            piece = piece[max_chars:]
+        if len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ''
+        current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+class GoogleBackend:
+    """Übersetzt über deep_translator.GoogleTranslator (Internet erforderlich)."""
+
+    def translate_batch(self, texts, target):
+        from deep_translator import GoogleTranslator
+        translator = GoogleTranslator(source='auto', target=target)
+        return [translator.translate(text) for text in texts]
+
+class IdentityBackend:
+    """Lokaler Ersatz für Tests und Offline-Betrieb: gibt den Text unverändert zurück."""
+
+    def translate_batch(self, texts, target):
+        return list(texts)
+
+BACKENDS = {
+    'google': GoogleBackend,
+    'identity': IdentityBackend,
+}
+
+class TranslationCache:
+    """SQLite-Cache mit Schlüssel (Hash des Quelltexts, Zielsprache) und LRU-Verdrängung."""
+
+    def __init__(self, path=TRANSLATION_CACHE_PATH, max_entries=TRANSLATION_CACHE_MAX_ENTRIES):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS translations ('
+            'text_hash TEXT NOT NULL, target TEXT NOT NULL, translated TEXT NOT NULL, last_used REAL NOT NULL, '
+            'PRIMARY KEY (text_hash, target))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)')
+        self._conn.commit()
+
+    @staticmethod
+    def _hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, text, target):
+        key = self._hash(text)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT translated FROM translations WHERE text_hash = ? AND target = ?', (key, target)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                'UPDATE translations SET last_used = ? WHERE text_hash = ? AND target = ?', (time.time(), key, target)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, text, target, translated):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)', (self._hash(text), target, translated, time.time())
+            )
+            self._inserts += 1
+            if self._inserts % EVICTION_INTERVAL == 0:
+                self._conn.execute(
+                    'DELETE FROM translations WHERE rowid IN '
+                    '(SELECT rowid FROM translations ORDER BY last_used DESC LIMIT -1 OFFSET ?)', (self.max_entries,)
+                )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class Translator:
+    """Übersetzt Texte abschnittsweise; bekannte Abschnitte kommen aus dem Cache."""
+
+    def __init__(self, backend=None, cache=None):
+        self.backend = backend or BACKENDS[TRANSLATION_BACKEND]()
+        self.cache = cache
+
+    def translate(self, text, target):
+        if not text.strip():
+            return text
+        if detect_language(text) == target:
+            return text  # Bereits in der Zielsprache, kein Netzwerkaufruf nötig
+
+        chunks = split_into_chunks(text)
+        results = [None] * len(chunks)
+        missing = []
+        for i, chunk in enumerate(chunks):
+            content = chunk.strip()
+            if not content:
+                results[i] = chunk
+                continue
+            cached = self.cache.get(content, target) if self.cache is not None else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                missing.append(i)
+
+        if missing:
+            translated = self.backend.translate_batch([chunks[i].strip() for i in missing], target)
+            for i, translation in zip(missing, translated):
+                if self.cache is not None:
+                    self.cache.put(chunks[i].strip(), target, translation)
+                results[i] = translation
+            logging.info(f"{len(missing)} von {len(chunks)} Abschnitten übersetzt, Rest aus dem Cache.")
+
+        # Leerraum zwischen den Abschnitten beibehalten
+        output = []
+        for chunk, translation in zip(chunks, results):
+            if not chunk.strip():
+                output.append(chunk)
+                continue
+            leading = chunk[:len(chunk) - len(chunk.lstrip())]
+            trailing = chunk[len(chunk.rstrip()):]
+            output.append(f"{leading}{translation}{trailing}")
+        return ''.join(output)
+
+_translator = None
+_translator_lock = threading.Lock()
+
+def get_translator():
+    """Liefert den gemeinsamen Translator mit Cache auf der Festplatte."""
+    global _translator
+    with _translator_lock:
+        if _translator is None:
+            try:
+                cache = TranslationCache()
+            except sqlite3.Error as e:
+                logging.error(f"Übersetzungs-Cache nicht verfügbar: {e}")
+                cache = None
+            _translator = Translator(cache=cache)
+        return _translator
@@ -1,53 +1,86 @@
-import subprocess
-import os
-import re
 import logging
-from datetime import datetime
-import ollama
+import queue
+import threading
+from config import KEEP_ALIVE
+from ollama_client import get_client
+from postprocess import clean_text
 
-# Logging konfigurieren
-logging.basicConfig(
-    filename='script.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+def clean_generated_text(generated_text):
+    """Bereinigt die fertige Modellantwort (dieselben Filter wie beim Streaming, siehe postprocess)."""
+    return clean_text(generated_text)
 
-def get_installed_models():
-    try:
-        result = subprocess.run(
-            ['/usr/local/bin/ollama', 'list'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=True
-        )
-        lines = result.stdout.strip().split('\n')
-        if len(lines) <= 1:
-            logging.warning("Keine Modelle gefunden.")
-            return {}
-        models = lines[1:]
-        model_dict = {str(i + 1): model_line.split()[0] for i, model_line in enumerate(models)}
-        logging.info(f"{len(model_dict)} Modelle gefunden.")
-        return model_dict
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Fehler beim Abrufen der Modelle: {e.stderr}")
-        return {}
-    except Exception as e:
-        logging.error(f"Unbekannter Fehler beim Abrufen der Modelle: {e}")
-        return {}
-
-def generate_ollama_prompt(selected_anweisung, user_input, selected_model):
+STAT_FIELDS = ('total_duration', 'load_duration', 'prompt_eval_count', 'prompt_eval_duration', 'eval_count', 'eval_duration')
+
+CANCEL_POLL_SECONDS = 0.1  # So oft wird cancel_event geprüft, solange kein Chunk kommt
+_STREAM_END = object()
+
+def stream_ollama_chat(messages, selected_model, cancel_event=None, stats=None, options=None):
+    """Liefert die Antwort des Modells über /api/chat Stück für Stück (stream=True).
+
+    Die Anfrage läuft in einem eigenen Thread, der die Chunks in eine
+    Warteschlange legt; so bemerkt der Generator ein gesetztes cancel_event
+    auch, während das Modell noch lädt oder den Prompt auswertet, und kehrt
+    sofort zurück. Grenze: ollama gibt keinen Zugriff auf die Verbindung, bevor
+    das erste Stück ankommt. Der Server arbeitet deshalb bis zum ersten Token
+    weiter; dann schließt der Thread den Generator von ollama und damit die
+    HTTP-Verbindung. Ein Abbruch mitten in der Antwort beendet sie sofort.
+    In stats (dict) werden die Zähler und Dauern (ns) des letzten Chunks abgelegt;
+    stats['done'] ist nur gesetzt, wenn der Server die Antwort vollständig gesendet hat.
+    Fehler (auch ein Verbindungsabbruch mitten in der Antwort) werden weitergereicht.
+    options sind die Generierungsoptionen des Modells (siehe model_options).
+    """
+    chunks = queue.SimpleQueue()
+    finished = threading.Event()  # Generator beendet (Abbruch, Stoppsequenz oder Fehler)
+    cancelled = lambda: cancel_event is not None and cancel_event.is_set()
+
+    def read():
+        stream = None
+        try:
+            stream = get_client().chat(model=selected_model, messages=messages, stream=True, options=options or None,
+                                       keep_alive=KEEP_ALIVE)
+            for chunk in stream:
+                if finished.is_set() or cancelled():
+                    break
+                chunks.put(chunk)
+            chunks.put(_STREAM_END)
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            if stream is not None:
+                stream.close()  # Bricht die HTTP-Verbindung ab, falls die Antwort noch läuft
+
+    threading.Thread(target=read, name='ollama-stream', daemon=True).start()
     try:
-        client = ollama.Client()
-        prompt = f"{selected_anweisung.strip()}\n{user_input.strip()}"
-        response = client.generate(model=selected_model, prompt=prompt)
-        if 'response' in response:
-            generated_text = response['response'].strip()
-            generated_text = generated_text.strip()  # Entfernt führende und nachfolgende Leerzeichen
-            if generated_text.endswith('\n.'):
-                generated_text = generated_text.replace('\n.', '').strip()  # Entfernt die Zeile mit dem Punkt am Ende (bei manchen LLM's ein häufiges Vorkommen)
-            generated_text = generated_text.lstrip().lstrip('"').rstrip('"')  # Anführungszeichen am Anfang und am Ende entfernen
-            return generated_text
-    except Exception as e:
-        logging.error(f"Fehler bei der Generierung des Textes: {e}")
-        return None
+        while True:
+            try:
+                chunk = chunks.get(timeout=CANCEL_POLL_SECONDS)
+            except queue.Empty:
+                chunk = None
+            if cancelled():
+                logging.info("Generierung abgebrochen.")
+                return
+            if chunk is None:
+                continue
+            if chunk is _STREAM_END:
+                return
+            if isinstance(chunk, Exception):
+                logging.error(f"Fehler bei der Generierung des Textes: {chunk}")
+                raise chunk
+            text = chunk['message']['content']
+            if text:
+                yield text
+            if chunk.get('done') and stats is not None:
+                stats.update({field: chunk.get(field) for field in STAT_FIELDS})
+                stats['done'] = True
+    finally:
+        finished.set()
+
+def summarize_messages(messages, selected_model, options=None):
+    """Fasst Chat-Nachrichten für den Kontextmodus 'summary' zusammen."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    client = get_client()
+    response = client.chat(model=selected_model, messages=[
+        {'role': 'system', 'content': 'Fasse das folgende Gespräch knapp zusammen. Behalte Fakten, Namen und offene Fragen.'},
+        {'role': 'user', 'content': transcript},
+    ], options=options or None, keep_alive=KEEP_ALIVE)
+    return clean_generated_text(response['message']['content'])